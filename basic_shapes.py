@@ -1,67 +1,998 @@
-import mypy
+from __future__ import annotations # annotations like np.ndarray don't import numpy
 from typing import Union
-from pyautocad import Autocad
-from pyautocad import APoint as P
-import ezdxf
 import array, itertools
 from math import atan, tan, sin, cos
-import pickle
-from math import pi, sqrt
+from math import pi, sqrt, floor, log2
 import datetime
+from contextlib import contextmanager
 import os
 # coordinates: micrometers
 # angles: radians
+# writer backends import their dependencies (pyautocad, ezdxf) only when selected in init()
+# numpy is imported on first use (importing ACS stays cheap)
 
-def init(
-    writer: str = "pyautocad",
-    filename: Union[str, None] = None,
-    reset: bool = False,
-):
-    """[initialize ACS]
+class LazyModule:
+    """[stand-in for a module that imports it on first attribute access and replaces itself in the module globals]
 
-    for the writers:
-    "pyautocad" is slow but you can see the effect in real time. 
-    "ezdxf" is fast but you must close file while using it.
+    Args:
+        name (str): [module name]
+        alias (str): [global name of the module in this file]
+    """
+    def __init__(self, name: str, alias: str):
+        self.name = name
+        self.alias = alias
+
+    def __getattr__(self, attribute):
+        import importlib
+        module = importlib.import_module(self.name)
+        globals()[self.alias] = module # later lookups get the module itself
+        return getattr(module, attribute)
+
+np = LazyModule("numpy", "np")
+
+font_cache = {} # loaded font data for each font path
+writers = {} # registered writer backends (writer name: writer class)
+writer_ = None # name of the writer selected by init()
+path = None # dxf file of the writer (None if the writer doesn't write a file)
+deduplicator = None # drops repeated polylines if init(dedupe=True)
+grid_ = None # database unit if init(grid=...) (vertices are stored as int64 multiples of grid_)
+block_ = None # name of block being defined (None: modelspace)
+enclosing_blocks_ = [] # names of blocks whose definition was interrupted by begin_block() (None: modelspace)
+extents_ = {} # bounding box of each layer ({layer: [xmin, ymin, xmax, ymax]})
+block_extents_ = {} # bounding box of each block defined since init() (in block coordinates)
+window_ = None # [xmin, ymin, xmax, ymax] of generation window if init(window=...) (shapes outside are skipped)
+fracture_ = None # tessellation tolerance if init(fracture=...) (polygons are written as trapezoids)
+file_digests = {} # sha256 digest of files ((path, mtime, size): digest)
+
+def register_writer(
+    name: str,
+):
+    """[class decorator that registers a writer backend under name (selectable with init(writer=name))]
 
     Args:
-        writer (str, optional): describes which writer to use to write to cad. Defaults to "pyautocad".
+        name (str): [name of the writer]
     """
-    global msp, writer_, doc, path
-    writer_ = writer
-    if writer == "pyautocad":
-        msp = Autocad()
-        msp.prompt("ACS running\n")
-        print(f"applying changes in file: {msp.doc.Name}")
-    elif writer == "ezdxf":
+    def decorator(cls):
+        writers[name] = cls
+        return cls
+    return decorator
+
+class Writer:
+    """[base class of writer backends]
+
+    a writer imports its dependencies in __init__ so that they are only loaded when the writer is selected.
+    msp, doc and path are exposed as module globals by init() for backward compatibility.
+    """
+    msp = None
+    doc = None
+    path = None
+
+    def __init__(
+        self,
+        filename: Union[str, None] = None,
+        reset: bool = False,
+        **options,
+    ):
+        pass
+
+    def end(self):
+        pass
+
+    def set_extents(self, box: list):
+        pass
+
+    def add_layer(self, layer: str):
+        raise NotImplementedError
+
+    def polyline(self, VerticesList: list, layer: Union[str, None] = None, bulges: Union[list, None] = None):
+        raise NotImplementedError
+
+    def set_bulge(self, polyline_obj, index: int, bulge: float):
+        raise NotImplementedError
+
+    def has_block(self, name: str):
+        raise NotImplementedError
+
+    def begin_block(self, name: str):
+        raise NotImplementedError
+
+    def end_block(self):
+        raise NotImplementedError
+
+    def insert_block(
+        self,
+        name: str,
+        x0: float,
+        y0: float,
+        scale: float = 1.0,
+        rotation: float = 0.0,
+        columns: int = 1,
+        rows: int = 1,
+        column_spacing: float = 0.0,
+        row_spacing: float = 0.0,
+        layer: Union[str, None] = None,
+    ):
+        raise NotImplementedError
+
+@register_writer("pyautocad")
+class PyautocadWriter(Writer):
+    """[writes to the running AutoCAD over ActiveX (slow but you can see the effect in real time)]
+    """
+    def __init__(self, filename=None, reset=False, **options):
+        from pyautocad import Autocad, APoint
+        self.APoint = APoint
+        self.msp = Autocad()
+        self.msp.prompt("ACS running\n")
+        print(f"applying changes in file: {self.msp.doc.Name}")
+        self.target = self.msp.model # layout or block polylines are added to
+        self.enclosing = [] # targets of enclosing block definitions
+
+    def add_layer(self, layer):
+        self.msp.ActiveDocument.Layers.Add(layer)
+
+    def polyline(self, VerticesList, layer=None, bulges=None):
+        flatten = lambda list1: list(itertools.chain.from_iterable(list1)) # flatten n dim list
+        VerticesList = flatten(VerticesList)
+        VerticesList = array.array("d", VerticesList) # convert to ActiveX compatible type
+        polyline_obj = self.target.AddLightWeightPolyline(VerticesList) # 2d polyline
+        polyline_obj.Closed = True # close the polyline (required for dxf -> imask2 conversion)
+        if layer is not None: # if layer is None, layer will be the currently selected layer in autocad
+            polyline_obj.Layer = layer # set layer of polyline
+        if bulges is not None:
+            for index, bulge in enumerate(bulges):
+                if bulge != 0:
+                    polyline_obj.SetBulge(index, bulge)
+        return polyline_obj
+
+    def set_bulge(self, polyline_obj, index, bulge):
+        polyline_obj.SetBulge(index, bulge)
+
+    def has_block(self, name):
+        try:
+            self.msp.doc.Blocks.Item(name)
+            return True
+        except Exception:
+            return False
+
+    def begin_block(self, name):
+        self.enclosing.append(self.target)
+        self.target = self.msp.doc.Blocks.Add(self.APoint(0, 0), name)
+
+    def end_block(self):
+        self.target = self.enclosing.pop()
+
+    def insert_block(self, name, x0, y0, scale=1.0, rotation=0.0, columns=1, rows=1, column_spacing=0.0, row_spacing=0.0, layer=None):
+        if columns == 1 and rows == 1:
+            insert_obj = self.target.InsertBlock(self.APoint(x0, y0), name, scale, scale, scale, rotation)
+        else: # MINSERT (block array)
+            insert_obj = self.target.AddMInsertBlock(self.APoint(x0, y0), name, scale, scale, scale, rotation, rows, columns, row_spacing, column_spacing)
+        if layer is not None:
+            insert_obj.Layer = layer
+        return insert_obj
+
+@register_writer("ezdxf")
+class EzdxfWriter(Writer):
+    """[writes to a dxf file with ezdxf (fast but you must close file while using it)]
+    """
+    block = None # block being defined (None: modelspace)
+    existing = None # summary of existing dxf file in append mode (see scan_dxf())
+    split_layers = False # write one dxf file per layer in end()
+    handles = None # handles of modelspace entities are appended here if it is a list (used by Layout.run())
+
+    def __init__(self, filename=None, reset=False, append=False, compact=False, width=None, precision=None, binary=False, split_layers=False, **options):
+        import ezdxf
+        if binary and append:
+            raise ValueError("append mode can only write ascii dxf files")
+        if split_layers and append:
+            raise ValueError("append mode can't split layers (existing entities are not loaded)")
+        self.split_layers = split_layers
+        self.layers = [] # layers registered with add_layer()
+        self.enclosing = [] # enclosing block definitions (None: modelspace)
+        self.compact = compact # no per-vertex widths (constant width or none)
+        self.width = width # constant width of compact polylines
+        self.precision = precision # number of decimals of coordinates
+        self.fmt = "bin" if binary else "asc"
         cwd = os.path.dirname(__file__)
+        if append and filename is not None and not reset and os.path.isfile(filename):
+            # existing file is not loaded: new entities are written to a scratch document and spliced in by end()
+            self.existing = scan_dxf(filename)
+            self.path = filename
+            self.doc = ezdxf.new(self.existing["dxfversion"])
+            self.msp = self.doc.modelspace()
+            return None
         if filename is not None:
             try:
-                doc = ezdxf.readfile(filename)
-                msp = doc.modelspace()
-                path = filename
+                self.doc = ezdxf.readfile(filename)
+                self.msp = self.doc.modelspace()
+                self.path = filename
                 if reset:            
-                    doc = ezdxf.new('R2010') # delete all components of a dxf file
-                    msp = doc.modelspace()
-                    doc.saveas(path)
+                    self.doc = ezdxf.new('R2010') # delete all components of a dxf file
+                    self.msp = self.doc.modelspace()
+                    if not split_layers: # only the layer files are written in split mode
+                        self.doc.saveas(self.path, fmt=self.fmt)
                 return None
             except Exception as e:
                 print(e)
-                path = os.path.join(cwd, "test", filename)    
+                self.path = self.output_path(filename)
         elif filename is None:
-            path = os.path.join(cwd, "test", f"{datetime.datetime.now().strftime('%Y-%d-%m_%H-%M-%S')}.dxf")
+            self.path = os.path.join(cwd, "test", f"{datetime.datetime.now().strftime('%Y-%d-%m_%H-%M-%S')}.dxf")
 
         directory = os.path.join(cwd, "test")
         if not os.path.isdir(directory):
             os.mkdir(directory)
-        doc = ezdxf.new("R2010")
-        doc.saveas(path)
-        msp = doc.modelspace()
+        self.doc = ezdxf.new("R2010")
+        if not split_layers:
+            self.doc.saveas(self.path, fmt=self.fmt)
+        self.msp = self.doc.modelspace()
+
+    @staticmethod
+    def output_path(filename):
+        """[path of the file written for filename (new relative filenames are placed in the test directory)]
+        """
+        if os.path.isfile(filename):
+            return filename
+        return os.path.join(os.path.dirname(__file__), "test", filename)
+
+    @property
+    def target(self): # layout or block polylines are added to
+        return self.block if self.block is not None else self.msp
+
+    def end(self):
+        if self.existing is not None:
+            append_dxf(self.path, self.doc, self.existing, extents())
+        elif self.split_layers:
+            write_layers(self.doc, self.path, self.layers, self.fmt, extents_)
+        else:
+            self.doc.save(fmt=self.fmt)
+
+    def set_extents(self, box):
+        layout = self.doc.modelspace().dxf # ezdxf copies the modelspace extents to $EXTMIN/$EXTMAX on save
+        xmin, ymin, xmax, ymax = box
+        (x1, y1, _), (x2, y2, _) = layout.extmin, layout.extmax
+        if x1 <= x2 and y1 <= y2: # merge with valid extents of the loaded file
+            xmin, ymin, xmax, ymax = min(xmin, x1), min(ymin, y1), max(xmax, x2), max(ymax, y2)
+        layout.extmin = (xmin, ymin, 0)
+        layout.extmax = (xmax, ymax, 0)
+        self.doc.header["$EXTMIN"] = (xmin, ymin, 0) # not copied on save if a corner is (0, 0, 0)
+        self.doc.header["$EXTMAX"] = (xmax, ymax, 0)
+
+    def add_layer(self, layer):
+        if layer not in self.layers:
+            self.layers.append(layer)
+        try:
+            self.doc.layers.add(name=layer)
+        except Exception as e:
+            print(e)
+
+    def polyline(self, VerticesList, layer=None, bulges=None):
+        if self.precision is not None:
+            VerticesList = np.round(VerticesList, self.precision).tolist()
+        if bulges is None:
+            bulges = [0 for i in range(len(VerticesList))]
+        if self.compact: # x, y, bulge only (widths are not written)
+            dxfattribs = {'layer': layer}
+            if self.width:
+                dxfattribs['const_width'] = self.width
+            polyline_obj = self.target.add_lwpolyline([[x,y,bulge] for [x,y],bulge in zip(VerticesList, bulges)], format="xyb", dxfattribs=dxfattribs)
+        else:
+            VerticesList = [[x,y,0.001,0.001,bulge] for [x,y],bulge in zip(VerticesList, bulges)] # add start and end width (1nm width: can be ignored)
+            polyline_obj = self.target.add_lwpolyline(VerticesList, dxfattribs={'layer': layer})
+        polyline_obj.closed = True
+        if self.handles is not None and self.block is None:
+            self.handles.append(polyline_obj.dxf.handle)
+        return polyline_obj
+
+    def set_bulge(self, polyline_obj, index, bulge):
+        x, y, start_width, end_width, _ = polyline_obj[index]
+        polyline_obj[index] = [x, y, start_width, end_width, bulge]
+
+    def has_block(self, name):
+        if self.existing is not None and name.upper() in self.existing["blocks"]:
+            return True
+        return name in self.doc.blocks
+
+    def begin_block(self, name):
+        self.enclosing.append(self.block)
+        self.block = self.doc.blocks.new(name)
+
+    def end_block(self):
+        self.block = self.enclosing.pop()
+
+    def insert_block(self, name, x0, y0, scale=1.0, rotation=0.0, columns=1, rows=1, column_spacing=0.0, row_spacing=0.0, layer=None):
+        dxfattribs = {"xscale": scale, "yscale": scale, "rotation": rotation*180/pi}
+        if layer is not None:
+            dxfattribs["layer"] = layer
+        insert_obj = self.target.add_blockref(name, (x0, y0), dxfattribs=dxfattribs)
+        if columns != 1 or rows != 1: # MINSERT (block array)
+            insert_obj.grid(size=(rows, columns), spacing=(row_spacing, column_spacing))
+        if self.handles is not None and self.block is None:
+            self.handles.append(insert_obj.dxf.handle)
+        return insert_obj
+
+@register_writer("pyautocad_batch")
+class PyautocadBatchWriter(EzdxfWriter):
+    """[accumulates shapes in a scratch ezdxf document and imports it into the running AutoCAD in end()]
+
+    one Import call over ActiveX replaces the AddLightWeightPolyline, Closed, Layer and SetBulge calls of every shape.
+    polylines without layer are written to layer "0".
+
+    Args:
+        acad (optional): [Autocad object (or a stand-in with doc.Import(path, point, scale))]. Defaults to None (pyautocad.Autocad()).
+    """
+    def __init__(self, filename=None, reset=False, acad=None, **options):
+        import ezdxf
+        if acad is None:
+            from pyautocad import Autocad
+            acad = Autocad()
+            acad.prompt("ACS running\n")
+        self.acad = acad
+        print(f"applying changes in file: {self.acad.doc.Name}")
+        self.compact, self.width, self.precision, self.fmt = True, None, None, "asc" # widths are not needed in the scratch file
+        self.layers = []
+        self.enclosing = []
+        self.doc = ezdxf.new("R2010")
+        self.msp = self.doc.modelspace()
+
+    def end(self):
+        import tempfile
+        handle, scratch_path = tempfile.mkstemp(suffix=".dxf")
+        os.close(handle)
+        try:
+            self.doc.saveas(scratch_path)
+            self.acad.doc.Import(scratch_path, array.array("d", [0.0, 0.0, 0.0]), 1.0) # insertion point, scale
+        finally:
+            os.remove(scratch_path)
+
+    def polyline(self, VerticesList, layer=None, bulges=None):
+        return super().polyline(VerticesList, layer or "0", bulges)
+
+    def has_block(self, name):
+        if name in self.doc.blocks:
+            return True
+        try:
+            self.acad.doc.Blocks.Item(name)
+            return True
+        except Exception:
+            return False
+
+@register_writer("record")
+class RecordWriter(Writer):
+    """[keeps polylines in memory as [vertices, layer, bulges] (used by sweep() workers)]
+    """
+    def __init__(self, filename=None, reset=False, **options):
+        self.entities = [] # [vertices, layer, bulges] of modelspace polylines
+        self.layers = []
+        self.blocks = {} # block name: entities
+        self.inserts = [] # [name, x0, y0, scale, rotation, columns, rows, column_spacing, row_spacing, layer] of modelspace inserts
+        self.block_inserts = {} # block name: inserts in the block
+        self.target = self.entities
+        self.insert_target = self.inserts
+        self.enclosing = [] # (target, insert_target) of enclosing block definitions
+
+    def add_layer(self, layer):
+        if layer not in self.layers:
+            self.layers.append(layer)
+
+    def polyline(self, VerticesList, layer=None, bulges=None):
+        polyline_obj = [VerticesList, layer, bulges]
+        self.target.append(polyline_obj)
+        return polyline_obj
+
+    def set_bulge(self, polyline_obj, index, bulge):
+        if polyline_obj[2] is None:
+            polyline_obj[2] = [0.0 for i in range(len(polyline_obj[0]))]
+        polyline_obj[2][index] = bulge
+
+    def has_block(self, name):
+        return name in self.blocks
+
+    def begin_block(self, name):
+        self.enclosing.append((self.target, self.insert_target))
+        self.target = self.blocks[name] = []
+        self.insert_target = self.block_inserts[name] = []
+
+    def end_block(self):
+        self.target, self.insert_target = self.enclosing.pop()
+
+    def insert_block(self, name, x0, y0, scale=1.0, rotation=0.0, columns=1, rows=1, column_spacing=0.0, row_spacing=0.0, layer=None):
+        insert_obj = [name, x0, y0, scale, rotation, columns, rows, column_spacing, row_spacing, layer]
+        self.insert_target.append(insert_obj)
+        return insert_obj
+
+class Deduplicator:
+    """[drops polylines that were already written (same layer, vertices and bulges)]
+
+    vertices are quantized before hashing so that float noise doesn't hide duplicates.
+    only the digests of the last max_entries polylines are kept, so memory use is bounded.
+
+    Args:
+        quantum (float, optional): [quantization step of coordinates]. Defaults to 1e-6.
+        max_entries (int, optional): [number of digests to remember]. Defaults to 100000.
+    """
+    def __init__(
+        self,
+        quantum: float = 1e-6,
+        max_entries: int = 100000,
+    ):
+        from collections import OrderedDict
+        self.quantum = quantum
+        self.max_entries = max_entries
+        self.digests = OrderedDict() # least recently seen first
+        self.removed = 0 # number of duplicates dropped
+
+    def is_duplicate(self, VerticesList, bulges=None, layer=None, block=None):
+        import hashlib
+        digest = hashlib.blake2b(f"{block}\0{layer}\0".encode(), digest_size=16)
+        vertices = np.asarray(VerticesList)
+        if vertices.dtype.kind != "i": # grid snapped vertices are hashed as they are
+            vertices = np.rint(vertices.astype(float)/self.quantum).astype(np.int64)
+        digest.update(vertices.tobytes())
+        if bulges is not None and any(bulges):
+            digest.update(np.rint(np.asarray(bulges, dtype=float)*1e9).astype(np.int64).tobytes())
+        digest = digest.digest()
+        if digest in self.digests:
+            self.digests.move_to_end(digest)
+            self.removed += 1
+            return True
+        self.digests[digest] = None
+        if len(self.digests) > self.max_entries:
+            self.digests.popitem(last=False)
+        return False
+
+# dxf streaming (append mode)
+
+handle_codes = {"5", "105", "330", "340", "347", "348", "350", "360", "390"} # group codes of handles and pointers
+
+def scan_dxf(
+    path: str,
+):
+    """[read handle seed, table handles, layer names and block names of a dxf file]
+
+    only the HEADER and TABLES sections are parsed (group codes are streamed, no entities are built).
+
+    Args:
+        path (str): [path of dxf file]
+
+    Returns:
+        [dict]: [summary of the dxf file]
+    """
+    existing = {"dxfversion": "AC1024", "handseed": None, "tables": {}, "layers": set(), "blocks": set(), "model_space": None}
+    section, entity, table, variable, handle = None, None, None, None, None
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        for code, value in zip(f, f): # (group code, value) pairs
+            code, value = code.strip(), value.strip()
+            if code == "0":
+                entity, handle = value, None
+                if value == "ENDTAB":
+                    table = None
+                continue
+            if entity == "SECTION" and code == "2":
+                section, entity = value, None # header variables have no 0 group code
+                if section in ("BLOCKS", "ENTITIES", "OBJECTS"): # tables are done
+                    break
+            elif section == "HEADER":
+                if code == "9":
+                    variable = value
+                elif variable == "$ACADVER" and code == "1":
+                    existing["dxfversion"] = value
+                elif variable == "$HANDSEED" and code == "5":
+                    existing["handseed"] = int(value, 16)
+            elif section == "TABLES":
+                if entity == "TABLE":
+                    if code == "2":
+                        table = value
+                    elif code == "5":
+                        existing["tables"][table] = value
+                elif entity == "LAYER" and code == "2":
+                    existing["layers"].add(value.upper())
+                elif entity == "BLOCK_RECORD":
+                    if code == "5":
+                        handle = value
+                    elif code == "2":
+                        existing["blocks"].add(value.upper())
+                        if value.upper() == "*MODEL_SPACE":
+                            existing["model_space"] = handle
+    if existing["handseed"] is None or existing["model_space"] is None:
+        raise ValueError(f"{path} has no handles (append mode requires DXF R2000 or later)")
+    return existing
+
+def append_dxf(
+    path: str,
+    doc,
+    existing: dict,
+    box: Union[list, None] = None,
+):
+    """[splice new layers, blocks and modelspace entities of doc into the existing dxf file]
+
+    the existing file is copied group code by group code, so memory use doesn't depend on its size.
+    handles of the new objects are renumbered from $HANDSEED of the existing file.
+    $EXTMIN and $EXTMAX are replaced by the union of the existing extents and box.
+
+    Args:
+        path (str): [path of existing dxf file]
+        doc ([ezdxf document]): [scratch document with new shapes]
+        existing (dict): [summary of the existing file (scan_dxf())]
+        box (list, optional): [xmin, ymin, xmax, ymax of the new shapes]. Defaults to None.
+    """
+    from ezdxf.lldxf.tagwriter import TagCollector
+
+    # new objects in the order they are written
+    layers = [layer for layer in doc.layers if layer.dxf.name.upper() not in existing["layers"]]
+    blocks = [block for block in doc.blocks if not block.is_any_layout and block.name.upper() not in existing["blocks"]]
+    msp = doc.modelspace()
+    objects = layers + [block.block_record for block in blocks]
+    for block in blocks:
+        objects += [block.block, *block, block.endblk]
+    objects += list(msp)
+
+    # handles of scratch document -> handles of existing file
+    handles = {
+        msp.block_record_handle: existing["model_space"],
+        doc.layers.head.dxf.handle: existing["tables"].get("LAYER"),
+        doc.block_records.head.dxf.handle: existing["tables"].get("BLOCK_RECORD"),
+        "0": "0",
+    }
+    seed = existing["handseed"]
+    for obj in objects:
+        handles[obj.dxf.handle] = f"{seed:X}"
+        seed += 1
+
+    def export(objs, newline):
+        lines = []
+        for obj in objs:
+            collector = TagCollector(dxfversion=existing["dxfversion"])
+            obj.export_dxf(collector)
+            for tag in collector.tags:
+                value = tag.value
+                if str(tag.code) in handle_codes:
+                    value = handles.get(value)
+                    if value is None: # pointer to an object that only exists in the scratch document (e.g. plot style)
+                        continue
+                lines.append(f"{tag.code:>3}{newline}{value}{newline}")
+        return "".join(lines)
+
+    temporary_path = path + ".acs_tmp"
+    section, entity, table, variable = None, None, None, None
+    written = set()
+    with open(path, encoding="utf-8", errors="surrogateescape", newline="") as src, \
+            open(temporary_path, "w", encoding="utf-8", errors="surrogateescape", newline="") as dst:
+        newline = None
+        for code_line, value_line in zip(src, src):
+            if newline is None:
+                newline = "\r\n" if code_line.endswith("\r\n") else "\n"
+            code, value = code_line.strip(), value_line.strip()
+            if code == "0":
+                entity = value
+                if value == "ENDTAB" and table == "LAYER":
+                    dst.write(export(layers, newline))
+                elif value == "ENDTAB" and table == "BLOCK_RECORD":
+                    dst.write(export([block.block_record for block in blocks], newline))
+                elif value == "ENDSEC" and section == "BLOCKS":
+                    dst.write(export([obj for block in blocks for obj in (block.block, *block, block.endblk)], newline))
+                    written.add(section)
+                elif value == "ENDSEC" and section == "ENTITIES":
+                    dst.write(export(msp, newline))
+                    written.add(section)
+                elif value == "EOF" and "ENTITIES" not in written: # file without ENTITIES section
+                    dst.write(f"  0{newline}SECTION{newline}  2{newline}ENTITIES{newline}")
+                    dst.write(export(msp, newline))
+                    dst.write(f"  0{newline}ENDSEC{newline}")
+                if value == "ENDTAB":
+                    table = None
+            elif entity == "SECTION" and code == "2":
+                section, entity = value, None # header variables have no 0 group code
+            elif entity == "TABLE" and code == "2":
+                table = value
+            elif section == "HEADER":
+                if code == "9":
+                    variable = value
+                elif variable == "$HANDSEED" and code == "5":
+                    value_line = f"{seed:X}{newline}"
+                elif box is not None and variable in ("$EXTMIN", "$EXTMAX") and code in ("10", "20"):
+                    axis = 0 if code == "10" else 1
+                    if variable == "$EXTMIN":
+                        value_line = f"{min(float(value), box[axis])!r}{newline}"
+                    else:
+                        value_line = f"{max(float(value), box[axis+2])!r}{newline}"
+            dst.write(code_line)
+            dst.write(value_line)
+    if blocks and "BLOCKS" not in written:
+        os.remove(temporary_path)
+        raise ValueError(f"{path} has no BLOCKS section")
+    os.replace(temporary_path, path)
+
+# per-layer output (split_layers mode)
+
+def entity_data(
+    entity,
+):
+    """[picklable data of LWPOLYLINE or INSERT entity (None for other entities)]
+
+    Args:
+        entity ([DXFEntity]): [entity of ezdxf document]
+    """
+    if entity.dxftype() == "LWPOLYLINE":
+        return ["LWPOLYLINE", entity.dxf.layer, [list(point) for point in entity.get_points("xyseb")], entity.closed, entity.dxf.const_width]
+    if entity.dxftype() == "INSERT":
+        dxf = entity.dxf
+        return ["INSERT", dxf.layer, dxf.name, list(dxf.insert)[:2], dxf.xscale, dxf.yscale, dxf.rotation, dxf.row_count, dxf.column_count, dxf.row_spacing, dxf.column_spacing]
+    return None
+
+def save_layer(
+    path: str,
+    dxfversion: str,
+    layer: str,
+    entities: list,
+    blocks: dict,
+    fmt: str = "asc",
+    box: Union[list, None] = None,
+):
+    """[write entities of one layer to a new dxf file (runs in worker processes of write_layers())]
+
+    Args:
+        path (str): [path of dxf file]
+        dxfversion (str): [dxf version of the document]
+        layer (str): [layer name]
+        entities (list): [entity_data() of entities in the layer]
+        blocks (dict): [{block name: entity_data() of entities in the block} for inserted blocks]
+        fmt (str, optional): ["asc" or "bin"]. Defaults to "asc".
+        box (list, optional): [xmin, ymin, xmax, ymax of the layer written to $EXTMIN/$EXTMAX]. Defaults to None.
+    """
+    import ezdxf
+    doc = ezdxf.new(dxfversion)
+    if box is not None: # written to $EXTMIN/$EXTMAX on save
+        doc.modelspace().dxf.extmin = (box[0], box[1], 0)
+        doc.modelspace().dxf.extmax = (box[2], box[3], 0)
+        doc.header["$EXTMIN"] = (box[0], box[1], 0) # not copied on save if a corner is (0, 0, 0)
+        doc.header["$EXTMAX"] = (box[2], box[3], 0)
+
+    def add(layout, data):
+        if data[1] not in doc.layers:
+            doc.layers.add(name=data[1])
+        if data[0] == "LWPOLYLINE":
+            _, entity_layer, points, closed, const_width = data
+            polyline_obj = layout.add_lwpolyline(points, format="xyseb", dxfattribs={"layer": entity_layer, "const_width": const_width})
+            polyline_obj.closed = closed
+        elif data[0] == "INSERT":
+            _, entity_layer, name, insert, xscale, yscale, rotation, rows, columns, row_spacing, column_spacing = data
+            insert_obj = layout.add_blockref(name, insert, dxfattribs={"layer": entity_layer, "xscale": xscale, "yscale": yscale, "rotation": rotation})
+            if columns != 1 or rows != 1:
+                insert_obj.grid(size=(rows, columns), spacing=(row_spacing, column_spacing))
+
+    if layer not in doc.layers:
+        doc.layers.add(name=layer)
+    for name, block_entities in blocks.items():
+        block = doc.blocks.new(name)
+        for data in block_entities:
+            add(block, data)
+    msp = doc.modelspace()
+    for data in entities:
+        add(msp, data)
+    doc.saveas(path, fmt=fmt)
+    return path
+
+def write_layers(
+    doc,
+    path: str,
+    layers: list,
+    fmt: str = "asc",
+    extents: Union[dict, None] = None,
+    processes: Union[int, None] = None,
+):
+    """[write each layer of doc to its own dxf file {path without extension}_{layer}.dxf]
+
+    entities are grouped by layer in one pass and the layer files are serialized concurrently in a process pool,
+    so the total time is bounded by the largest layer. only LWPOLYLINE and INSERT entities (written by ACS) are split.
+
+    Args:
+        doc ([Drawing]): [ezdxf document]
+        path (str): [path of the combined dxf file]
+        layers (list): [layers that get a file even if they are empty]
+        fmt (str, optional): ["asc" or "bin"]. Defaults to "asc".
+        extents (dict, optional): [{layer: bounding box} written to the header of each layer file]. Defaults to None.
+        processes (int, optional): [number of worker processes]. Defaults to None (number of cpus).
+
+    Returns:
+        [dict]: [{layer: path of dxf file}]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    entities = {layer: [] for layer in layers}
+    skipped = 0
+    for entity in doc.modelspace():
+        data = entity_data(entity)
+        if data is None:
+            skipped += 1
+            continue
+        entities.setdefault(data[1], []).append(data)
+    if skipped:
+        print(f"{skipped} entities other than LWPOLYLINE and INSERT are not written to the layer files")
+    block_data = {} # block name: entity_data() of its entities (only computed for inserted blocks)
+    for layer_entities in entities.values():
+        for data in layer_entities:
+            if data[0] == "INSERT" and data[2] not in block_data:
+                block_data[data[2]] = [block_entity for block_entity in map(entity_data, doc.blocks.get(data[2])) if block_entity is not None]
+    root, extension = os.path.splitext(path)
+    paths = {layer: f"{root}_{layer}{extension}" for layer in entities}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                save_layer, paths[layer], doc.dxfversion, layer, layer_entities,
+                {name: block_data[name] for name in dict.fromkeys(data[2] for data in layer_entities if data[0] == "INSERT")}, fmt,
+                (extents or {}).get(layer),
+            )
+            for layer, layer_entities in entities.items()
+        ]
+        for future in futures:
+            future.result()
+    return paths
+
+def init(
+    writer: str = "pyautocad",
+    filename: Union[str, None] = None,
+    reset: bool = False,
+    append: bool = False,
+    dedupe: Union[bool, Deduplicator] = False,
+    grid: Union[int, float, None] = None,
+    compact: bool = False,
+    width: Union[int, float, None] = None,
+    precision: Union[int, None] = None,
+    binary: bool = False,
+    split_layers: bool = False,
+    fracture: Union[int, float, None] = None,
+    window: Union[list, None] = None,
+    **options,
+):
+    """[initialize ACS]
+
+    for the writers:
+    "pyautocad" is slow but you can see the effect in real time. 
+    "ezdxf" is fast but you must close file while using it.
+    "pyautocad_batch" writes to the running AutoCAD like "pyautocad", but imports all shapes at once in end().
+    other writers can be added with register_writer().
+
+    append mode ("ezdxf" only):
+    the existing file is not loaded. msp and doc only contain the new shapes,
+    which are spliced into the file by end() while the existing entities are streamed through unchanged.
+
+    compact mode ("ezdxf" only):
+    polylines are written without the per-vertex start and end widths of 0.001 (smaller and faster to parse files).
+    precision rounds coordinates when writing and binary writes a binary dxf file (not in append mode).
+
+    split layers mode ("ezdxf" only):
+    end() writes each layer to its own file {filename without extension}_{layer}.dxf instead of the combined file.
+
+    fracture mode:
+    every polygon is written as horizontal trapezoids (see fracture()), arcs are tessellated with the fracture tolerance.
+
+    window (preview of a region):
+    polylines, block inserts and texts whose bounding box doesn't overlap the window are skipped
+    (shapes in block definitions are always written).
+    shape functions still return their points.
+
+    Args:
+        writer (str, optional): describes which writer to use to write to cad. Defaults to "pyautocad".
+        filename (str, optional): [dxf file to write to]. Defaults to None.
+        reset (bool, optional): [delete all components of the dxf file]. Defaults to False.
+        append (bool, optional): [append new shapes to a large existing dxf file without loading it]. Defaults to False.
+        dedupe (bool or Deduplicator, optional): [drop repeated polylines (the number is reported by end())]. Defaults to False.
+        grid (float, optional): [database unit in micrometers (e.g. 0.001 = 1nm), vertices are snapped to the grid]. Defaults to None.
+        compact (bool, optional): [write polylines without per-vertex widths]. Defaults to False.
+        width (float, optional): [constant width of compact polylines]. Defaults to None (no width).
+        precision (int, optional): [number of decimals of written coordinates]. Defaults to None (full precision).
+        binary (bool, optional): [write binary dxf file]. Defaults to False.
+        split_layers (bool, optional): [write one dxf file per layer in end()]. Defaults to False.
+        fracture (float, optional): [write polygons as trapezoids, arcs are tessellated with this tolerance]. Defaults to None.
+        window (list, optional): [xmin, ymin, xmax, ymax of the region to generate]. Defaults to None (everything).
+        **options: [other keyword arguments of the writer (e.g. acad of "pyautocad_batch")]
+    """
+    global msp, writer_, doc, path, backend, deduplicator, block_, enclosing_blocks_, grid_, extents_, block_extents_, fracture_, window_
+    grid_ = grid
+    fracture_ = fracture
+    window_ = window
+    extents_, block_extents_ = {}, {}
+    deduplicator = Deduplicator() if dedupe is True else (dedupe or None)
+    block_, enclosing_blocks_ = None, []
+    if writer not in writers:
+        raise ValueError(f"unknown writer {writer}, choose from {list(writers)}")
+    writer_ = writer
+    backend = writers[writer](filename=filename, reset=reset, append=append, compact=compact, width=width, precision=precision, binary=binary, split_layers=split_layers, **options)
+    msp, doc, path = backend.msp, backend.doc, backend.path
 
 def end():
-    """[save dxf if writer=="ezdxf"]
+    """[finish writing (save dxf if writer=="ezdxf")]
     """
-    if writer_ == "ezdxf":
-        doc.save()
+    if deduplicator is not None:
+        print(f"removed {deduplicator.removed} duplicate polylines")
+    box = extents()
+    if box is not None:
+        backend.set_extents(box)
+    backend.end()
+
+def in_window(
+    xmin,
+    ymin,
+    xmax,
+    ymax,
+):
+    """[check if bounding box overlaps the generation window (also works with arrays of boxes)]
+
+    Args:
+        xmin, ymin, xmax, ymax ([float or array]): [bounding box]
+
+    Returns:
+        [bool or bool array]: [True if there is no window or a block is being defined]
+    """
+    if window_ is None:
+        return True
+    if block_ is not None: # block contents are in block coordinates (inserts are culled by insert_block())
+        return np.full(np.broadcast(xmin, ymin, xmax, ymax).shape, True)[()]
+    wx1, wy1, wx2, wy2 = window_
+    return (xmax >= wx1) & (xmin <= wx2) & (ymax >= wy1) & (ymin <= wy2)
+
+def update_extents(
+    box: list,
+    layer: Union[str, None] = None,
+):
+    """[merge bounding box into the extents of layer (or of the block being defined)]
+
+    Args:
+        box (list): [xmin, ymin, xmax, ymax]
+        layer (str, optional): [layer of the shape]. Defaults to None.
+    """
+    boxes, key = (extents_, layer) if block_ is None else (block_extents_, block_)
+    if key not in boxes:
+        boxes[key] = [float(value) for value in box]
+        return None
+    old = boxes[key]
+    boxes[key] = [float(min(old[0], box[0])), float(min(old[1], box[1])), float(max(old[2], box[2])), float(max(old[3], box[3]))]
+
+def extents(
+    layer: Union[str, None] = None,
+):
+    """[bounding box of everything written since init() (kept up to date while writing, bulged arcs included)]
+
+    Args:
+        layer (str, optional): [only the shapes of layer]. Defaults to None (all layers).
+
+    Returns:
+        [list]: [xmin, ymin, xmax, ymax] (None if nothing was written)
+    """
+    if layer is not None:
+        return extents_.get(layer)
+    if not extents_:
+        return None
+    boxes = np.array(list(extents_.values()))
+    return boxes[:, :2].min(axis=0).tolist() + boxes[:, 2:].max(axis=0).tolist()
+
+def layer_extents():
+    """[bounding box of each layer ({layer: [xmin, ymin, xmax, ymax]})]
+    """
+    return {layer: list(box) for layer, box in extents_.items()}
+
+def build_key(
+    build,
+    args: tuple = (),
+    kwargs: Union[dict, None] = None,
+    font_path: str = "font_data.pickle",
+    dependencies: Union[list, tuple] = (),
+):
+    """[hash of a layout build (function name and source file, parameters, font data, dependencies and ACS version)]
+
+    the whole source file of build is hashed, so changes of helper functions in the same file change the key.
+    helpers in other files must be listed in dependencies.
+
+    Args:
+        build ([function]): [function generating the layout (calls init() ... end())]
+        args (tuple, optional): [positional parameters of build]. Defaults to ().
+        kwargs (dict, optional): [keyword parameters of build]. Defaults to None.
+        font_path (str, optional): [path of font data pickle file]. Defaults to "font_data.pickle".
+        dependencies (list, optional): [paths of other files build depends on (e.g. modules of helper functions)]. Defaults to ().
+
+    Returns:
+        [str]: [hex digest]
+    """
+    import hashlib, inspect, pickle
+    key = hashlib.sha256()
+    key.update(f"{build.__module__}.{build.__qualname__}".encode())
+    try:
+        source_path = inspect.getsourcefile(build)
+    except TypeError:
+        source_path = None
+    if source_path is not None and os.path.isfile(source_path):
+        key.update(file_digest(source_path))
+    else: # source not available (e.g. interactive session)
+        key.update(build.__code__.co_code)
+    parameters = (args, sorted((kwargs or {}).items()))
+    try:
+        key.update(pickle.dumps(parameters, protocol=4))
+    except Exception:
+        key.update(repr(parameters).encode())
+    for version_path in [font_path, __file__]: # font data version, ACS version
+        if os.path.isfile(version_path):
+            key.update(file_digest(version_path))
+    for dependency in dependencies:
+        key.update(os.path.basename(dependency).encode())
+        key.update(file_digest(dependency)) # missing dependencies raise FileNotFoundError
+    return key.hexdigest()
+
+def file_digest(
+    path: str,
+):
+    """[sha256 digest of file (remembered until the file is modified)]
+
+    Args:
+        path (str): [path of file]
+    """
+    import hashlib
+    stat = os.stat(path)
+    file_id = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if file_id not in file_digests:
+        with open(path, "rb") as f:
+            file_digests[file_id] = hashlib.sha256(f.read()).digest()
+    return file_digests[file_id]
+
+def cached_build(
+    build,
+    *args,
+    filename: Union[str, None] = None,
+    cache_dir: Union[str, None] = None,
+    max_entries: int = 64,
+    max_bytes: int = 2**30,
+    font_path: str = "font_data.pickle",
+    dependencies: Union[list, tuple] = (),
+    **kwargs,
+):
+    """[run build(*args, **kwargs) or reuse the dxf file of an identical previous build]
+
+    the cache key is build_key() of the call. cache entries are evicted least recently used first
+    when there are more than max_entries files or more than max_bytes in total.
+
+    Args:
+        build ([function]): [function generating the layout (calls init(writer="ezdxf", ...) ... end())]
+        filename (str, optional): [where the dxf file should be (copied from the cache on hit)]. Defaults to None.
+        cache_dir (str, optional): [cache directory]. Defaults to None ("cache" next to this file).
+        max_entries (int, optional): [max number of cached dxf files]. Defaults to 64.
+        max_bytes (int, optional): [max total size of cached dxf files]. Defaults to 1GiB.
+        font_path (str, optional): [path of font data pickle file]. Defaults to "font_data.pickle".
+        dependencies (list, optional): [paths of other files build depends on (see build_key())]. Defaults to ().
+
+    Returns:
+        [str]: [path of the dxf file]
+    """
+    import shutil
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(__file__), "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{build_key(build, args, kwargs, font_path, dependencies)}.dxf")
+    if os.path.isfile(cache_path): # hit
+        os.utime(cache_path) # mark as recently used
+        print(f"using cached build: {cache_path}")
+        if filename is None:
+            return cache_path
+        shutil.copyfile(cache_path, filename)
+        return filename
+
+    # miss
+    build(*args, **kwargs)
+    output = path # set by init() in build
+    if output is None or not os.path.isfile(output):
+        raise ValueError(f"build didn't write a dxf file (cached_build needs init(writer=\"ezdxf\", ...), got writer {writer_})")
+    temporary_path = cache_path + ".acs_tmp"
+    shutil.copyfile(output, temporary_path)
+    os.replace(temporary_path, cache_path) # other processes never see a partial file
+    if filename is not None and os.path.abspath(filename) != os.path.abspath(output):
+        shutil.copyfile(output, filename)
+        output = filename
+
+    # evict least recently used entries
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".dxf")]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    total = 0
+    for count, entry in enumerate(entries):
+        total += os.path.getsize(entry)
+        if entry != cache_path and (count >= max_entries or total > max_bytes):
+            os.remove(entry)
+    return output
 
 def add_layers(
     layers: list,
@@ -71,15 +1002,8 @@ def add_layers(
     Args:
         layers (list): list of layer names
     """
-    global msp, writer_, doc
     for layer in layers:
-        if writer_ == "pyautocad":
-            msp.ActiveDocument.Layers.Add(layer)
-        elif writer_ == "ezdxf":
-            try:
-                doc.layers.add(name=layer)
-            except Exception as e:
-                print(e)
+        backend.add_layer(layer)
 
 def calculate_bulge(
     angle: Union[int, float], 
@@ -93,38 +1017,197 @@ def calculate_bulge(
 
 # drawing function
 
+def snap(
+    VerticesList: list,
+):
+    """[convert vertices to (N,2) array (int64 database units if init(grid=...), float otherwise)]
+
+    Args:
+        VerticesList ([float 2d list]): [coordinates in micrometers]
+    """
+    vertices = np.asarray(VerticesList, dtype=float).reshape(-1, 2)
+    if grid_ is None:
+        return vertices
+    return np.rint(vertices/grid_).astype(np.int64)
+
+def to_layout_units(
+    vertices: np.ndarray,
+):
+    """[convert vertices from snap() back to float micrometers (writer boundary)]
+
+    Args:
+        vertices ([array]): [vertices returned by snap()]
+    """
+    if grid_ is None or vertices.dtype.kind != "i":
+        return vertices
+    scale = 1/grid_
+    if abs(scale - round(scale)) < 1e-9: # e.g. 1000 for 1nm grid
+        return vertices/round(scale) # division gives the float closest to the decimal value (no 99.99999999)
+    return vertices*grid_
+
 def polyline(
     VerticesList: list,
     layer: Union[str, None] = None,
+    bulges: Union[dict, None] = None,
 ):
     """[create polyline from 2d list]
 
+    returns None if the polyline is dropped as a duplicate (init(dedupe=True)).
+
     Args:
         VerticesList ([float 2d list]): [coordinates of the polyline]
         layer (str, optional): [layer of the polyline]. Defaults to None.
+        bulges (dict, optional): [{vertex index: angle of the arc starting at the vertex}]. Defaults to None.
     """
-    flatten = lambda list1: list(itertools.chain.from_iterable(list1)) # flatten n dim list
-    global writer_
-    if writer_ == "pyautocad":
-        VerticesList = flatten(VerticesList)
-        VerticesList = array.array("d", VerticesList) # convert to ActiveX compatible type
-        polyline_obj = msp.model.AddLightWeightPolyline(VerticesList) # 2d polyline
-        polyline_obj.Closed = True # close the polyline (required for dxf -> imask2 conversion)
-        if layer is not None: # if layer is None, layer will be the currently selected layer in autocad
-            polyline_obj.Layer = layer # set layer of polyline
-    elif writer_ == "ezdxf":
-        VerticesList = [[x,y,0.001,0.001] for [x,y] in VerticesList] # add start and end width (1nm width: can be ignored)
-        polyline_obj = msp.add_lwpolyline(VerticesList, dxfattribs={'layer': layer})
-        polyline_obj.closed = True
-    return polyline_obj
+    bulge_list = None
+    if bulges:
+        bulge_list = [0.0 for i in range(len(VerticesList))]
+        for index, angle in bulges.items():
+            bulge_list[index] = calculate_bulge(angle)
+    return emit(VerticesList, layer, bulge_list)
+
+def emit(
+    VerticesList: list,
+    layer: Union[str, None] = None,
+    bulges: Union[list, None] = None,
+):
+    """[write polyline with bulge values (tan(angle/4)) of each vertex to the writer]
+
+    Args:
+        VerticesList ([float 2d list]): [coordinates of the polyline]
+        layer (str, optional): [layer of the polyline]. Defaults to None.
+        bulges (list, optional): [bulge of each vertex]. Defaults to None.
+    """
+    if window_ is not None and not in_window(*bounding_box(VerticesList, bulges)):
+        return None
+    if fracture_ is not None: # write the trapezoids of the polygon instead (returns None like dropped duplicates)
+        for trapezoid in fracture(VerticesList, bulges, fracture_):
+            write_polyline(trapezoid, layer)
+        return None
+    return write_polyline(VerticesList, layer, bulges)
+
+def write_polyline(
+    VerticesList: list,
+    layer: Union[str, None] = None,
+    bulges: Union[list, None] = None,
+):
+    """[snap, dedupe and write polyline to the writer (see emit())]
+    """
+    bulge_list = bulges
+    vertices = snap(VerticesList)
+    if deduplicator is not None and deduplicator.is_duplicate(vertices, bulge_list, layer, block_):
+        return None
+    vertices = to_layout_units(vertices)
+    update_extents(bounding_box(vertices, bulge_list), layer)
+    return backend.polyline(vertices.tolist(), layer, bulge_list)
+
+def polylines(
+    VerticesArray: np.ndarray,
+    layer: Union[str, None] = None,
+):
+    """[write many polylines with the same number of vertices at once]
+
+    vertices of all polylines are snapped and converted in one vectorized pass.
+
+    Args:
+        VerticesArray ([float 3d array]): [(N,M,2) coordinates of N polylines with M vertices]
+        layer (str, optional): [layer of the polylines]. Defaults to None.
+    """
+    VerticesArray = np.asarray(VerticesArray, dtype=float)
+    if window_ is not None:
+        lows, highs = VerticesArray.min(axis=1), VerticesArray.max(axis=1)
+        VerticesArray = VerticesArray[in_window(lows[:, 0], lows[:, 1], highs[:, 0], highs[:, 1])]
+    if fracture_ is not None:
+        for VerticesList in VerticesArray:
+            emit(VerticesList, layer)
+        return None
+    N, M = VerticesArray.shape[:2]
+    vertices = snap(VerticesArray).reshape(N, M, 2)
+    kept = np.array([deduplicator is None or not deduplicator.is_duplicate(vertices[i], None, layer, block_) for i in range(N)], dtype=bool)
+    layout_vertices = to_layout_units(vertices[kept])
+    if len(layout_vertices):
+        update_extents(layout_vertices.min(axis=(0, 1)).tolist() + layout_vertices.max(axis=(0, 1)).tolist(), layer)
+    for VerticesList in layout_vertices.tolist():
+        backend.polyline(VerticesList, layer)
 
 def set_bulge(polyline_obj, index, bulge):
-    global writer_
-    if writer_ == "pyautocad":
-        polyline_obj.SetBulge(index, calculate_bulge(bulge))
-    elif writer_ == "ezdxf":
-        x, y, start_width, end_width, _ = polyline_obj[index]
-        polyline_obj[index] = [x, y, start_width, end_width, calculate_bulge(bulge)]
+    if polyline_obj is None: # dropped as duplicate
+        return None
+    backend.set_bulge(polyline_obj, index, calculate_bulge(bulge))
+
+def has_block(
+    name: str,
+):
+    """[check if block is already defined]
+
+    Args:
+        name (str): [block name]
+    """
+    return backend.has_block(name)
+
+def begin_block(
+    name: str,
+):
+    """[start block definition (polylines are added to the block until end_block() is called)]
+
+    shapes in a block are defined relative to the block origin (0,0).
+    use layer="0" for block contents so that they inherit the layer of the insert.
+    block definitions can be nested (e.g. glyph blocks defined by texts() in a die block),
+    the enclosing definition continues after end_block().
+
+    Args:
+        name (str): [block name]
+    """
+    global block_
+    enclosing_blocks_.append(block_)
+    block_ = name
+    backend.begin_block(name)
+
+def end_block():
+    """[finish block definition (polylines and inserts are added to the enclosing block or modelspace again)]
+    """
+    global block_
+    block_ = enclosing_blocks_.pop()
+    backend.end_block()
+
+def insert_block(
+    name: str,
+    x0: Union[int, float],
+    y0: Union[int, float],
+    scale: Union[int, float] = 1.0,
+    rotation: Union[int, float] = 0.0,
+    columns: int = 1,
+    rows: int = 1,
+    column_spacing: Union[int, float] = 0.0,
+    row_spacing: Union[int, float] = 0.0,
+    layer: Union[str, None] = None,
+):
+    """[insert block (or block array if columns or rows > 1)]
+
+    Args:
+        name (str): [block name]
+        x0 ([float]): [x coordinate of the block origin (bottom left block of array)]
+        y0 ([float]): [y coordinate of the block origin (bottom left block of array)]
+        scale (float, optional): [magnification ratio]. Defaults to 1.0.
+        rotation (float, optional): [rotation angle]. Defaults to 0.0.
+        columns (int, optional): [number of columns of block array]. Defaults to 1.
+        rows (int, optional): [number of rows of block array]. Defaults to 1.
+        column_spacing (float, optional): [x pitch of block array]. Defaults to 0.0.
+        row_spacing (float, optional): [y pitch of block array]. Defaults to 0.0.
+        layer (str, optional): [layer of the insert]. Defaults to None.
+    """
+    if grid_ is not None:
+        (x0, y0), (column_spacing, row_spacing) = to_layout_units(snap([[x0, y0], [column_spacing, row_spacing]])).tolist()
+    if name in block_extents_: # corners of the first and last blocks of the array (exact if rotation is a multiple of pi/2)
+        xmin, ymin, xmax, ymax = block_extents_[name]
+        corners = np.array([[x, y] for x in [xmin, xmax] for y in [ymin, ymax]])*scale
+        corners = np.concatenate([corners + [dx, dy] for dx in [0, (columns-1)*column_spacing] for dy in [0, (rows-1)*row_spacing]])
+        corners = corners @ np.array([[cos(rotation), sin(rotation)], [-sin(rotation), cos(rotation)]]) + [x0, y0]
+        box = corners.min(axis=0).tolist() + corners.max(axis=0).tolist()
+        if not in_window(*box):
+            return None
+        update_extents(box, layer)
+    return backend.insert_block(name, x0, y0, scale, rotation, columns, rows, column_spacing, row_spacing, layer)
 
 # low level functions
 
@@ -139,6 +1222,7 @@ def load_font(
         "unicode_counts" : counts,
         "unicode_characters" : unicodes,
         "contour_coordinates": contours_list,
+        "simplified_contours": {tolerance_level: contours_list}, # filled lazily by text()
     }
 
     Args:
@@ -149,9 +1233,94 @@ def load_font(
     """
     # assertions
 
-    with open(path, mode='rb') as f:
-        font_data = pickle.load(f)
-    return font_data
+    path = os.path.abspath(path)
+    if path not in font_cache: # unpickle each font only once (alignment_mark() calls load_font() every time)
+        import pickle
+        with open(path, mode='rb') as f:
+            font_data = pickle.load(f)
+        font_data["simplified_contours"] = {}
+        font_cache[path] = font_data
+    return font_cache[path]
+
+def simplify_contour(
+    contour: list,
+    tolerance: Union[int, float],
+):
+    """[simplify closed contour with Douglas-Peucker algorithm]
+
+    Args:
+        contour ([float 2d list]): [coordinates of the contour]
+        tolerance ([float]): [max distance between the simplified and the original contour]
+
+    Returns:
+        [2d list]: [list of x,y coordinates]
+    """
+    N = len(contour)
+    if N <= 3 or tolerance <= 0:
+        return [list(point) for point in contour]
+    # split the closed contour at the point farthest from p0 (DP needs an open curve)
+    x0, y0 = contour[0]
+    split = max(range(N), key=lambda i: (contour[i][0]-x0)**2 + (contour[i][1]-y0)**2)
+    keep = [False for i in range(N)]
+    keep[0] = keep[split] = True
+    stack = [(0, split), (split, N)] # (first, last) index pairs, index N wraps to p0
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        xa, ya = contour[first]
+        xb, yb = contour[last % N]
+        dx, dy = xb - xa, yb - ya
+        length = sqrt(dx*dx + dy*dy)
+        max_distance, max_index = -1, first
+        for i in range(first+1, last):
+            x, y = contour[i]
+            if length == 0:
+                distance = sqrt((x-xa)**2 + (y-ya)**2)
+            else:
+                distance = abs(dy*(x-xa) - dx*(y-ya))/length # distance from chord
+            if distance > max_distance:
+                max_distance, max_index = distance, i
+        if max_distance > tolerance:
+            keep[max_index] = True
+            stack.extend([(first, max_index), (max_index, last)])
+    return [list(contour[i]) for i in range(N) if keep[i]]
+
+def tolerance_level(
+    tolerance: Union[int, float, None],
+):
+    """[round tolerance down to a power of 2 (None if no simplification)]
+
+    Args:
+        tolerance ([float]): [tolerance in font units]
+    """
+    if tolerance is None or tolerance <= 0:
+        return None
+    return 2**floor(log2(tolerance)) # never coarser than tolerance
+
+def simplified_contours(
+    font_data: dict,
+    tolerance: Union[int, float],
+):
+    """[get glyph contours simplified with tolerance (font units), cached per tolerance level]
+
+    tolerance is rounded down to a power of 2 so that labels of similar heights share one cache entry.
+
+    Args:
+        font_data ([dict]): [font data including coordinates]
+        tolerance ([float]): [tolerance in font units]
+
+    Returns:
+        [list]: [contour coordinates for each char]
+    """
+    level = tolerance_level(tolerance)
+    cache = font_data.setdefault("simplified_contours", {})
+    if level not in cache:
+        cache[level] = [
+            [simplify_contour(contour, level) for contour in contours]
+            for contours in font_data["contour_coordinates"]
+        ]
+    return cache[level]
 
 def text(
     x0: Union[int, float],
@@ -160,6 +1329,7 @@ def text(
     string: str, 
     font_data: dict, 
     layer: Union[str, None] = None,
+    tolerance: Union[int, float, None] = None,
 ):
     """[write text as polyline]
 
@@ -169,7 +1339,10 @@ def text(
         height ([int]): [max height of texts]
         string ([str]): [text]
         font_data ([dict]): [font data including coordinates]
+        tolerance (float, optional): [max deviation of simplified glyph contours in layout units (micrometers)]. Defaults to None (no simplification).
     """
+    if window_ is not None and not in_window(*text_box(x0, y0, height, len(string), font_data)):
+        return None
 
     unicode_characters = font_data["unicode_characters"]
     unicode_counts = font_data["unicode_counts"]
@@ -179,6 +1352,8 @@ def text(
     offset_x = x0 # bottom left x coordinate of char
     offset_y = y0 # bottom left y coordinate of char
     ratio = height/max_height # magnification ratio
+    if tolerance is not None and tolerance > 0:
+        contour_coordinates = simplified_contours(font_data, tolerance/ratio) # tolerance in font units
     for char in string:
         if ord(char) in unicode_counts: # if unicode is valid and exists in font_data
             index = unicode_counts.index(ord(char))
@@ -193,6 +1368,339 @@ def text(
             print(f"character {char}(unicode:{ord(char)}) doesn't exist in font_data")
             offset_x += 5
 
+def text_box(
+    x0,
+    y0,
+    height,
+    length,
+    font_data: dict,
+):
+    """[cheap bounding box of text from its parameters (larger than the text, also works with arrays of texts)]
+
+    Args:
+        x0 ([float or array]): [bottom left x coordinate]
+        y0 ([float or array]): [bottom left y coordinate]
+        height ([float or array]): [max height of text]
+        length ([int or array]): [number of chars]
+        font_data ([dict]): [font data including coordinates]
+
+    Returns:
+        [list]: [xmin, ymin, xmax, ymax]
+    """
+    if "max_width" not in font_data:
+        font_data["max_width"] = max(font_data["widths"], default=0)
+    advance = np.maximum(font_data["max_width"]*height/font_data["max_height"], 5) # missing chars advance by 5
+    return [x0 - height, y0 - height, x0 + length*advance + height, y0 + height] # margin of height for bearings and descenders
+
+def text_widths(
+    strings: list,
+    heights: Union[int, float, list],
+    font_data: dict,
+):
+    """[advance width of each text (same advances as texts())]
+
+    Args:
+        strings ([list of str]): [texts]
+        heights ([float or list of floats]): [max height of each text]
+        font_data ([dict]): [font data including coordinates]
+
+    Returns:
+        [array]: [width of each text]
+    """
+    glyphs = glyph_arrays(font_data)
+    lengths = np.array([len(string) for string in strings], dtype=np.int64)
+    codes = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    ratios = np.broadcast_to(np.asarray(heights, dtype=float), (len(strings),))/font_data["max_height"]
+    sorted_counts = glyphs["sorted_counts"]
+    found = np.minimum(np.searchsorted(sorted_counts, codes), len(sorted_counts)-1)
+    valid = sorted_counts[found] == codes
+    advances = np.where(valid, glyphs["widths"][glyphs["sorted_index"][found]]*np.repeat(ratios, lengths), 5) # missing chars advance by 5
+    return np.add.reduceat(np.append(advances, 0), np.cumsum(lengths) - lengths)*(lengths > 0)
+
+def glyph_arrays(
+    font_data: dict,
+    tolerance: Union[int, float, None] = None,
+):
+    """[get glyph contours of font as flat numpy arrays, cached per tolerance level]
+
+    glyph_arrays = {
+        "sorted_counts": unicode counts in ascending order,
+        "sorted_index": glyph index of each sorted unicode count,
+        "widths": width of each glyph,
+        "glyph_starts": first contour index of each glyph (+ total number of contours),
+        "contour_starts": first vertex index of each contour (+ total number of vertices),
+        "vertices": (number of vertices, 2) array of all contour coordinates,
+    }
+
+    Args:
+        font_data ([dict]): [font data including coordinates]
+        tolerance (float, optional): [tolerance of simplification in font units]. Defaults to None.
+
+    Returns:
+        [dict]: [glyph arrays]
+    """
+    level = tolerance_level(tolerance)
+    cache = font_data.setdefault("glyph_arrays", {})
+    if level not in cache:
+        contours_list = font_data["contour_coordinates"] if level is None else simplified_contours(font_data, level)
+        counts = np.asarray(font_data["unicode_counts"], dtype=np.int64)
+        order = np.argsort(counts, kind="stable") # unicode_counts.index() returns the first match
+        contour_counts = [len(contours) for contours in contours_list]
+        vertex_counts = [len(contour) for contours in contours_list for contour in contours]
+        vertices = [point for contours in contours_list for contour in contours for point in contour]
+        cache[level] = {
+            "sorted_counts": counts[order],
+            "sorted_index": order,
+            "widths": np.asarray(font_data["widths"], dtype=float),
+            "glyph_starts": np.concatenate([[0], np.cumsum(contour_counts, dtype=np.int64)]),
+            "contour_starts": np.concatenate([[0], np.cumsum(vertex_counts, dtype=np.int64)]),
+            "vertices": np.asarray(vertices, dtype=float).reshape(-1, 2),
+        }
+    return cache[level]
+
+def font_id(
+    font_data: dict,
+):
+    """[short digest of the glyph contours of font (tells glyph blocks of different fonts apart)]
+
+    Args:
+        font_data ([dict]): [font data including coordinates]
+
+    Returns:
+        [str]: [8 hex digits]
+    """
+    if "font_id" not in font_data:
+        import hashlib
+        glyphs = glyph_arrays(font_data)
+        digest = hashlib.sha256()
+        for key in ["sorted_counts", "widths", "glyph_starts", "contour_starts", "vertices"]:
+            digest.update(np.ascontiguousarray(glyphs[key]).tobytes())
+        font_data["font_id"] = digest.hexdigest()[:8].upper()
+    return font_data["font_id"]
+
+def concatenated_ranges(
+    starts: np.ndarray,
+    ids: np.ndarray,
+):
+    """[concatenate ranges starts[id]:starts[id+1] for each id without python loop]
+
+    Args:
+        starts ([int array]): [start index of each range (+ end of the last range)]
+        ids ([int array]): [ranges to concatenate]
+
+    Returns:
+        [tuple]: [concatenated indices, length of each range]
+    """
+    lengths = starts[ids+1] - starts[ids]
+    offsets = starts[ids] - (np.cumsum(lengths) - lengths) # start of range - position in output
+    return np.arange(lengths.sum()) + np.repeat(offsets, lengths), lengths
+
+def texts(
+    positions: list,
+    strings: list,
+    heights: Union[int, float, list],
+    font_data: dict,
+    layer: Union[str, None] = None,
+    tolerance: Union[int, float, None] = None,
+    blocks: bool = True,
+):
+    """[write many texts as polylines at once (e.g. die numbering)]
+
+    advance widths are calculated for all chars with one cumulative sum.
+    blocks=True defines each distinct glyph once as a block and inserts it for every char.
+    blocks=False transforms the outlines of all chars in one vectorized pass and writes them as polylines.
+
+    Args:
+        positions ([float 2d list]): [bottom left x,y coordinates of each text]
+        strings ([list of str]): [texts]
+        heights ([float or list of floats]): [max height of each text]
+        font_data ([dict]): [font data including coordinates]
+        layer (str, optional): [layer of the texts]. Defaults to None.
+        tolerance (float, optional): [max deviation of simplified glyph contours in layout units]. Defaults to None.
+        blocks (bool, optional): [write glyphs as block inserts]. Defaults to True.
+    """
+    M = len(strings)
+    if M == 0:
+        return None
+    positions = np.asarray(positions, dtype=float).reshape(M, 2)
+    ratios = np.broadcast_to(np.asarray(heights, dtype=float), (M,))/font_data["max_height"] # magnification ratios
+    if window_ is not None: # skip texts outside the generation window
+        lengths = np.array([len(string) for string in strings])
+        inside = in_window(*text_box(positions[:, 0], positions[:, 1], ratios*font_data["max_height"], lengths, font_data))
+        strings = [string for string, keep in zip(strings, inside.tolist()) if keep]
+        positions, ratios, M = positions[inside], ratios[inside], len(strings)
+        if M == 0:
+            return None
+    font_tolerance = None
+    if tolerance is not None and tolerance > 0:
+        font_tolerance = tolerance/ratios.max() # finest tolerance in font units
+    glyphs = glyph_arrays(font_data, font_tolerance)
+
+    # glyph index of each char
+    lengths = np.array([len(string) for string in strings], dtype=np.int64)
+    codes = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    string_ids = np.repeat(np.arange(M), lengths)
+    sorted_counts = glyphs["sorted_counts"]
+    found = np.minimum(np.searchsorted(sorted_counts, codes), len(sorted_counts)-1)
+    valid = sorted_counts[found] == codes # if unicode is valid and exists in font_data
+    glyph_ids = glyphs["sorted_index"][found]
+    for code in np.unique(codes[~valid]):
+        print(f"character {chr(code)}(unicode:{code}) doesn't exist in font_data")
+
+    # bottom left coordinate of each char (cumulative sum of advance widths within each string)
+    advances = np.where(valid, glyphs["widths"][glyph_ids]*ratios[string_ids], 5) # move x coordinate by 5 if char doesn't exist
+    cumulative = np.concatenate([[0], np.cumsum(advances)])
+    string_starts = np.cumsum(lengths) - lengths
+    offsets_x = positions[string_ids, 0] + cumulative[:-1] - cumulative[np.repeat(string_starts, lengths)]
+    offsets_y = positions[string_ids, 1]
+
+    # chars with outlines
+    glyph_starts = glyphs["glyph_starts"]
+    drawn = valid & (glyph_starts[glyph_ids+1] > glyph_starts[glyph_ids])
+    glyph_ids, offsets_x, offsets_y, char_ratios = glyph_ids[drawn], offsets_x[drawn], offsets_y[drawn], ratios[string_ids][drawn]
+    codes = codes[drawn]
+    contour_starts = glyphs["contour_starts"]
+    vertices = glyphs["vertices"]
+
+    if blocks:
+        level = tolerance_level(font_tolerance)
+        suffix = "" if level is None else f"_T{level:g}"
+        prefix = f"ACS_GLYPH_{font_id(font_data)}_"
+        names = {}
+        for glyph_id, code in zip(*np.unique(np.stack([glyph_ids, codes]), axis=1)):
+            names[glyph_id] = f"{prefix}{code:X}{suffix}"
+            if has_block(names[glyph_id]):
+                continue
+            begin_block(names[glyph_id]) # glyph in font units (scaled by insert)
+            for contour_id in range(glyph_starts[glyph_id], glyph_starts[glyph_id+1]):
+                polyline(vertices[contour_starts[contour_id]:contour_starts[contour_id+1]].tolist(), "0")
+            end_block()
+        for glyph_id, x, y, ratio in zip(glyph_ids.tolist(), offsets_x.tolist(), offsets_y.tolist(), char_ratios.tolist()):
+            insert_block(names[glyph_id], x, y, scale=ratio, layer=layer)
+    else:
+        contour_ids, contour_counts = concatenated_ranges(glyph_starts, glyph_ids)
+        vertex_ids, vertex_counts = concatenated_ranges(contour_starts, contour_ids)
+        char_of_vertex = np.repeat(np.repeat(np.arange(len(glyph_ids)), contour_counts), vertex_counts)
+        coordinates = vertices[vertex_ids]*char_ratios[char_of_vertex, None] # consider magnification ratio
+        coordinates[:, 0] += offsets_x[char_of_vertex]
+        coordinates[:, 1] += offsets_y[char_of_vertex]
+        for contour in np.split(coordinates, np.cumsum(vertex_counts)[:-1]):
+            polyline(contour.tolist(), layer)
+
+# point buffers
+
+class Points:
+    """[compact buffer of x,y coordinates returned by shape functions]
+
+    list-like: points[i] is [x, y], points[i:j] is a Points copy, len(), iteration, + and == work like lists.
+    points[i] is a Point (list) that writes element assignments back (points[i][0] = x changes the buffer).
+    backed by (N,2) float64 numpy arrays (np.asarray(points) doesn't copy).
+    Points.concatenate() keeps the parts as segments without copying,
+    they are joined into one array only when a slice, assignment or the whole array is needed.
+
+    Args:
+        data ([float 2d list or array], optional): [x,y coordinates]. Defaults to ().
+    """
+    __slots__ = ("segments", "offsets")
+
+    def __init__(self, data=()):
+        if type(data) is list and data and type(data[0]) is list: # x,y lists of shape functions (faster than np.asarray)
+            data = np.fromiter(itertools.chain.from_iterable(data), dtype=float, count=2*len(data))
+        self.segments = [np.asarray(data, dtype=float).reshape(-1, 2)]
+        self.offsets = None # start index of each segment (for indexing before segments are joined)
+
+    @classmethod
+    def empty(cls, N: int):
+        """[buffer of N uninitialized points (filled with points[i] = [x, y])]
+        """
+        return cls(np.empty((N, 2)))
+
+    @classmethod
+    def concatenate(cls, parts: list):
+        """[join Points (or 2d lists) without copying their coordinates]
+        """
+        points = cls.__new__(cls)
+        points.segments = [segment for part in parts for segment in (part.segments if isinstance(part, Points) else Points(part).segments)]
+        points.offsets = None
+        return points
+
+    @property
+    def data(self): # (N,2) array
+        if len(self.segments) != 1:
+            self.segments = [np.concatenate(self.segments) if self.segments else np.empty((0, 2))]
+            self.offsets = None
+        return self.segments[0]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): # copy like list slices
+            return Points(self.data[index].copy())
+        if len(self.segments) == 1:
+            N = len(self.segments[0])
+            if index < 0:
+                index += N
+            if not 0 <= index < N:
+                raise IndexError("point index out of range")
+            return Point(self.segments[0][index].tolist(), self, index)
+        if self.offsets is None:
+            self.offsets = np.cumsum([0] + [len(segment) for segment in self.segments])
+        if index < 0:
+            index += self.offsets[-1]
+        if not 0 <= index < self.offsets[-1]:
+            raise IndexError("point index out of range")
+        k = np.searchsorted(self.offsets, index, side="right") - 1
+        return Point(self.segments[k][index - self.offsets[k]].tolist(), self, int(index))
+
+    def __setitem__(self, index, value):
+        self.data[index] = np.asarray(value, dtype=float)
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment.tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.data, dtype=dtype)
+
+    def __add__(self, other):
+        return Points.concatenate([self, other])
+
+    def __radd__(self, other):
+        return Points.concatenate([other, self])
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(list(a) == list(b) for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def __repr__(self):
+        return f"Points({self.tolist()})"
+
+class Point(list):
+    """[x, y list of a point in Points (element assignments are written back to the buffer)]
+    """
+    __slots__ = ("owner", "index")
+
+    def __init__(self, xy, owner=None, index=None):
+        super().__init__(xy)
+        self.owner = owner
+        self.index = index
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self.owner is not None:
+            self.owner[self.index] = list(self)
+
+    def __reduce__(self): # pickled as plain list
+        return (list, (list(self),))
+
 # define basic shapes
 
 def cross(
@@ -217,23 +1725,24 @@ def cross(
         layer (str, optional): [layer of the polyline]. Defaults to None.
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     # define point coordinates with offset (x,y)
-    points = [0 for i in range(12)]
-    points[0]  = [x0 + -w/2, y0 + l]
-    points[1]  = [x0 + -w/2, y0 + w/2]
-    points[2]  = [x0 + -l  , y0 + w/2]
-    points[3]  = [x0 + -l  , y0 + -w/2]
-    points[4]  = [x0 + -w/2, y0 + -w/2]
-    points[5]  = [x0 + -w/2, y0 + -l]
-    points[6]  = [x0 + w/2 , y0 + -l]
-    points[7]  = [x0 + w/2 , y0 + -w/2]
-    points[8]  = [x0 + l   , y0 + -w/2]
-    points[9]  = [x0 + l   , y0 + w/2]
-    points[10] = [x0 + w/2 , y0 + w/2]
-    points[11] = [x0 + w/2 , y0 + l]
+    points = Points([
+        [x0 + -w/2, y0 + l], # p0
+        [x0 + -w/2, y0 + w/2], # p1
+        [x0 + -l  , y0 + w/2], # p2
+        [x0 + -l  , y0 + -w/2], # p3
+        [x0 + -w/2, y0 + -w/2], # p4
+        [x0 + -w/2, y0 + -l], # p5
+        [x0 + w/2 , y0 + -l], # p6
+        [x0 + w/2 , y0 + -w/2], # p7
+        [x0 + l   , y0 + -w/2], # p8
+        [x0 + l   , y0 + w/2], # p9
+        [x0 + w/2 , y0 + w/2], # p10
+        [x0 + w/2 , y0 + l], # p11
+    ])
     # define connections
     polyline_obj = polyline(points, layer) # connect points with polyline
     return points
@@ -260,7 +1769,7 @@ def square(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -276,11 +1785,12 @@ def square(
     }
     start_coordinate = start_coordinates[xy0_position]
     # define point coordinates with offset (x0,y0)
-    points = [0 for i in range(4)]
-    points[0] = [start_coordinate[0],     start_coordinate[1] + y]
-    points[1] = [start_coordinate[0],     start_coordinate[1]]
-    points[2] = [start_coordinate[0] + x, start_coordinate[1]]
-    points[3] = [start_coordinate[0] + x, start_coordinate[1] + y]
+    points = Points([
+        [start_coordinate[0],     start_coordinate[1] + y], # p0
+        [start_coordinate[0],     start_coordinate[1]], # p1
+        [start_coordinate[0] + x, start_coordinate[1]], # p2
+        [start_coordinate[0] + x, start_coordinate[1] + y], # p3
+    ])
     # define connections
     polyline_obj = polyline(points, layer) # connect points with polyline
     return points
@@ -311,19 +1821,18 @@ def circle(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
         "center": [x0, y0],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(2)]
-    points[0] = [start_coordinate[0]+r/2, start_coordinate[1]]
-    points[1] = [start_coordinate[0]-r/2, start_coordinate[1]]
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 0, pi)
-    set_bulge(polyline_obj, 1, pi)
+    points = Points([
+        [start_coordinate[0]+r/2, start_coordinate[1]], # p0
+        [start_coordinate[0]-r/2, start_coordinate[1]], # p1
+    ])
+    polyline_obj = polyline(points, layer, bulges={0: pi, 1: pi})
     return points
 
 def triangle(
@@ -356,7 +1865,7 @@ def triangle(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -365,10 +1874,11 @@ def triangle(
         "point2": [x0 - r2*cos(angle1), y0 - r2*sin(angle1)],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(3)]
-    points[0] = [start_coordinate[0],                  start_coordinate[1]]
-    points[1] = [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)]
-    points[2] = [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)]
+    points = Points([
+        [start_coordinate[0],                  start_coordinate[1]], # p0
+        [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)], # p1
+        [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)], # p2
+    ])
     polyline_obj = polyline(points, layer)
     return points
 
@@ -400,7 +1910,7 @@ def circular_sector(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -409,12 +1919,14 @@ def circular_sector(
         "point2": [x0 - r*cos(angle2), y0 - r*sin(angle2)],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(3)]
-    points[0] = [start_coordinate[0],                 start_coordinate[1]]
-    points[1] = [start_coordinate[0] + r*cos(angle1), start_coordinate[1] + r*sin(angle1)]
-    points[2] = [start_coordinate[0] + r*cos(angle2), start_coordinate[1] + r*sin(angle2)]
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 1, angle2 - angle1) # inner_arc
+    points = Points([
+        [start_coordinate[0],                 start_coordinate[1]], # p0
+        [start_coordinate[0] + r*cos(angle1), start_coordinate[1] + r*sin(angle1)], # p1
+        [start_coordinate[0] + r*cos(angle2), start_coordinate[1] + r*sin(angle2)], # p2
+    ])
+    polyline_obj = polyline(points, layer, bulges={
+        1: angle2 - angle1, # inner_arc
+    })
     return points
 
 def annular_sector(
@@ -448,7 +1960,7 @@ def annular_sector(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -459,14 +1971,16 @@ def annular_sector(
         "point3": [x0 - r1*cos(angle2), y0 - r1*sin(angle2)],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(4)]
-    points[0] = [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)]
-    points[1] = [start_coordinate[0] + r2*cos(angle1), start_coordinate[1] + r2*sin(angle1)]
-    points[2] = [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)]
-    points[3] = [start_coordinate[0] + r1*cos(angle2), start_coordinate[1] + r1*sin(angle2)]
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 3, angle1 - angle2) # inner_arc
-    set_bulge(polyline_obj, 1, angle2 - angle1) # outer_arc
+    points = Points([
+        [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)], # p0
+        [start_coordinate[0] + r2*cos(angle1), start_coordinate[1] + r2*sin(angle1)], # p1
+        [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)], # p2
+        [start_coordinate[0] + r1*cos(angle2), start_coordinate[1] + r1*sin(angle2)], # p3
+    ])
+    polyline_obj = polyline(points, layer, bulges={
+        3: angle1 - angle2, # inner_arc
+        1: angle2 - angle1, # outer_arc
+    })
     return points
 
 def annular_sector_with_anchor_points(
@@ -505,7 +2019,7 @@ def annular_sector_with_anchor_points(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -518,16 +2032,18 @@ def annular_sector_with_anchor_points(
         "point5": [x0 - r3*cos(angle1), y0 - r3*sin(angle1)],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(4)]
-    points[0] = [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)]
-    points[1] = [start_coordinate[0] + r2*cos(angle1), start_coordinate[1] + r2*sin(angle1)]
-    points[2] = [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)]
-    points[3] = [start_coordinate[0] + r1*cos(angle2), start_coordinate[1] + r1*sin(angle2)]
-    points[4] = [start_coordinate[0] + r3*cos(angle2), start_coordinate[1] + r3*sin(angle2)]
-    points[5] = [start_coordinate[0] + r3*cos(angle1), start_coordinate[1] + r3*sin(angle1)]
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 3, angle1 - angle2) # inner_arc
-    set_bulge(polyline_obj, 1, angle2 - angle1) # outer_arc
+    points = Points([
+        [start_coordinate[0] + r1*cos(angle1), start_coordinate[1] + r1*sin(angle1)], # p0
+        [start_coordinate[0] + r2*cos(angle1), start_coordinate[1] + r2*sin(angle1)], # p1
+        [start_coordinate[0] + r2*cos(angle2), start_coordinate[1] + r2*sin(angle2)], # p2
+        [start_coordinate[0] + r1*cos(angle2), start_coordinate[1] + r1*sin(angle2)], # p3
+        [start_coordinate[0] + r3*cos(angle2), start_coordinate[1] + r3*sin(angle2)], # p4
+        [start_coordinate[0] + r3*cos(angle1), start_coordinate[1] + r3*sin(angle1)], # p5
+    ])
+    polyline_obj = polyline(points, layer, bulges={
+        3: angle1 - angle2, # inner_arc
+        1: angle2 - angle1, # outer_arc
+    })
     return points
 
 def annular_square_1(
@@ -561,7 +2077,7 @@ def annular_square_1(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -573,14 +2089,16 @@ def annular_square_1(
         "point4": [x0 - r1*cos(angle2),                      y0 - r1*sin(angle2)],
     }
     start_coordinate = start_coordinates[xy0_position]
-    points = [0 for i in range(5)]
-    points[0] = [start_coordinate[0] + r1*cos(angle1),                      start_coordinate[1] + r1*sin(angle1)]
-    points[1] = [start_coordinate[0] + r2*cos(angle1),                      start_coordinate[1] + r2*sin(angle1)]
-    points[2] = [start_coordinate[0] + (r2*sqrt(2))*cos((angle1+angle2)/2), start_coordinate[1] + (r2*sqrt(2))*sin((angle1+angle2)/2)]
-    points[3] = [start_coordinate[0] + r2*cos(angle2),                      start_coordinate[1] + r2*sin(angle2)]
-    points[4] = [start_coordinate[0] + r1*cos(angle2),                      start_coordinate[1] + r1*sin(angle2)]
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 4, angle1 - angle2) # inner_arc
+    points = Points([
+        [start_coordinate[0] + r1*cos(angle1),                      start_coordinate[1] + r1*sin(angle1)], # p0
+        [start_coordinate[0] + r2*cos(angle1),                      start_coordinate[1] + r2*sin(angle1)], # p1
+        [start_coordinate[0] + (r2*sqrt(2))*cos((angle1+angle2)/2), start_coordinate[1] + (r2*sqrt(2))*sin((angle1+angle2)/2)], # p2
+        [start_coordinate[0] + r2*cos(angle2),                      start_coordinate[1] + r2*sin(angle2)], # p3
+        [start_coordinate[0] + r1*cos(angle2),                      start_coordinate[1] + r1*sin(angle2)], # p4
+    ])
+    polyline_obj = polyline(points, layer, bulges={
+        4: angle1 - angle2, # inner_arc
+    })
     return points
 
 def annular_square_2(
@@ -614,7 +2132,7 @@ def annular_square_2(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     start_coordinates = {
@@ -626,14 +2144,16 @@ def annular_square_2(
     }
     start_coordinate = start_coordinates[xy0_position]
 
-    points = [0 for i in range(4)]
-    points[0] = [start_coordinate[0] + r1*cos(angle1),                  start_coordinate[1] + r1*sin(angle1)]
-    points[1] = [start_coordinate[0] + r2*cos(angle1),                  start_coordinate[1] + r2*sin(angle1)]
-    points[2] = [start_coordinate[0] + r2*cos(angle1) + r1*cos(angle2), start_coordinate[1] + r2*sin(angle1) + r1*sin(angle2)]
-    points[3] = [start_coordinate[0] + r1*cos(angle2),                  start_coordinate[1] + r1*sin(angle2)]
+    points = Points([
+        [start_coordinate[0] + r1*cos(angle1),                  start_coordinate[1] + r1*sin(angle1)], # p0
+        [start_coordinate[0] + r2*cos(angle1),                  start_coordinate[1] + r2*sin(angle1)], # p1
+        [start_coordinate[0] + r2*cos(angle1) + r1*cos(angle2), start_coordinate[1] + r2*sin(angle1) + r1*sin(angle2)], # p2
+        [start_coordinate[0] + r1*cos(angle2),                  start_coordinate[1] + r1*sin(angle2)], # p3
+    ])
 
-    polyline_obj = polyline(points, layer)
-    set_bulge(polyline_obj, 3, angle1 - angle2) # inner_arc
+    polyline_obj = polyline(points, layer, bulges={
+        3: angle1 - angle2, # inner_arc
+    })
     return points
 
 def trapezoid(
@@ -669,7 +2189,7 @@ def trapezoid(
         layer (str, optional): [definers the layer of the square]. Defaults to None
 
     Returns:
-        [2d list]: [list of x,y coordinates]
+        [Points]: [x,y coordinates]
     """
 
     if parallel_axis == "x":
@@ -689,11 +2209,12 @@ def trapezoid(
         start_coordinate = start_coordinates[xy0_position]
 
         # define point coordinates with start coordinate (p1 is at start coordinate)
-        points = [0 for i in range(4)]
-        points[0] = [start_coordinate[0] + x2/2 + x12 - x1/2, start_coordinate[1] + y]
-        points[1] = [start_coordinate[0], start_coordinate[1]]
-        points[2] = [start_coordinate[0] + x2 , start_coordinate[1]]
-        points[3] = [start_coordinate[0] + x2/2 + x12 + x1/2 , start_coordinate[1] + y]
+        points = Points([
+            [start_coordinate[0] + x2/2 + x12 - x1/2, start_coordinate[1] + y], # p0
+            [start_coordinate[0], start_coordinate[1]], # p1
+            [start_coordinate[0] + x2 , start_coordinate[1]], # p2
+            [start_coordinate[0] + x2/2 + x12 + x1/2 , start_coordinate[1] + y], # p3
+        ])
     elif parallel_axis == "y":
         y1,y2 = widths # right, left
         y12 = offset # offset of right and left (right center - left center y coordinate)
@@ -709,11 +2230,12 @@ def trapezoid(
         start_coordinate = start_coordinates[xy0_position]
 
         # define point coordinates with start coordinate (p0 is at start coordinate)
-        points = [0 for i in range(4)]
-        points[0] = [start_coordinate[0],     start_coordinate[1]]
-        points[1] = [start_coordinate[0],     start_coordinate[1] - y2]
-        points[2] = [start_coordinate[0] + x, start_coordinate[1] - y2/2 + y12 - y1/2]
-        points[3] = [start_coordinate[0] + x, start_coordinate[1] - y2/2 + y12 + y1/2]
+        points = Points([
+            [start_coordinate[0],     start_coordinate[1]], # p0
+            [start_coordinate[0],     start_coordinate[1] - y2], # p1
+            [start_coordinate[0] + x, start_coordinate[1] - y2/2 + y12 - y1/2], # p2
+            [start_coordinate[0] + x, start_coordinate[1] - y2/2 + y12 + y1/2], # p3
+        ])
     # define connections
     polyline(points, layer) # connect points with polyline
     return points
@@ -725,6 +2247,18 @@ def alignment_mark(
 
     """
 
+    if in_window(-6125, -6125, 6125, 6125): # crosses and corner indicators
+        alignment_mark_crosses(layer)
+
+    # top left indicator
+    font_data = load_font()
+    text(-6200,6200,2000,"Top-Left", font_data, layer=layer) # write "Top-Left" at top left corner
+
+def alignment_mark_crosses(
+    layer: Union[str, None] = None,
+):
+    """[crosses and corner cross indicators of alignment_mark()]
+    """
     # crosses
     # center points for crosses (exclude x or y = 0)
     # -6000,-5500,...,6000
@@ -738,16 +2272,83 @@ def alignment_mark(
         x,y = cross_center
         cross(x,y,layer=layer)    
 
-    # top left indicator
-    font_data = load_font()
-    text(-6200,6200,2000,"Top-Left", font_data, layer=layer) # write "Top-Left" at top left corner
-
     # corner cross indicator (located at 4 corners)
     triangle(-5850,5850,300,300,pi*3/2,0, layer=layer) # top left
     triangle(-5850,-5850,300,300,0,pi/2, layer=layer)  # bottom left
     triangle(5850,-5850,300,300,pi/2,pi, layer=layer)  # bottom right
     triangle(5850,5850,300,300,pi,pi*3/2, layer=layer) # top right
 
+def wafer_map(
+    die,
+    pitch: Union[int, float, list],
+    diameter: Union[int, float],
+    edge_exclusion: Union[int, float] = 0.0,
+    x0: Union[int, float] = 0.0,
+    y0: Union[int, float] = 0.0,
+    die_size: Union[int, float, list, None] = None,
+    name: Union[str, None] = None,
+    layer: Union[str, None] = None,
+):
+    """[step and repeat die across a circular wafer (partial dies at the wafer edge are dropped)]
+
+    die sites are calculated with numpy for the whole wafer at once.
+    every row of dies is written as one block array (MINSERT), not as expanded geometry.
+
+      . [ ][ ][ ] .
+     [ ][ ][ ][ ][ ]
+     [ ][ ][x][ ][ ]   x: (x0,y0) (center of die at wafer center)
+     [ ][ ][ ][ ][ ]
+      . [ ][ ][ ] .
+
+    Args:
+        die ([str or function]): [block name of die or function drawing the die centered at (0,0) (may call text() or texts())]
+        pitch ([float or list]): [x,y pitch of dies]
+        diameter ([float]): [wafer diameter]
+        edge_exclusion (float, optional): [width of wafer edge without dies]. Defaults to 0.0.
+        x0 (float, optional): [x coordinate of wafer center]. Defaults to 0.0.
+        y0 (float, optional): [y coordinate of wafer center]. Defaults to 0.0.
+        die_size ([float or list], optional): [x,y size of die]. Defaults to None (same as pitch).
+        name (str, optional): [block name if die is a function]. Defaults to None (name of function).
+        layer (str, optional): [layer of the block arrays]. Defaults to None.
+
+    Returns:
+        [tuple]: [(N,2) array of die centers, (N,2) array of column,row indices (0,0 at wafer center)]
+    """
+
+    pitch_x, pitch_y = np.broadcast_to(np.asarray(pitch, dtype=float), (2,))
+    die_x, die_y = np.broadcast_to(np.asarray(pitch if die_size is None else die_size, dtype=float), (2,))
+    r = diameter/2 - edge_exclusion # radius of usable area
+    # die block
+    if callable(die):
+        name = die.__name__ if name is None else name
+        if not has_block(name):
+            begin_block(name)
+            try:
+                die() # text() and texts() in die label every die (glyph blocks are nested in the die block)
+            finally:
+                end_block()
+    else:
+        name = die
+
+    # die sites (die is valid if the corner farthest from the center is in the usable area)
+    columns = np.arange(-int(r//pitch_x)-1, int(r//pitch_x)+2)
+    rows = np.arange(-int(r//pitch_y)-1, int(r//pitch_y)+2)
+    column_ids, row_ids = np.meshgrid(columns, rows) # row major
+    far_x = np.abs(column_ids*pitch_x) + die_x/2
+    far_y = np.abs(row_ids*pitch_y) + die_y/2
+    valid = far_x**2 + far_y**2 <= r**2
+    indices = np.stack([column_ids[valid], row_ids[valid]], axis=1)
+    centers = indices*[pitch_x, pitch_y] + [x0, y0]
+
+    # one block array for each row (valid dies in a row are contiguous)
+    counts = valid.sum(axis=1)
+    firsts = np.argmax(valid, axis=1)
+    for row, count, first in zip(rows.tolist(), counts.tolist(), firsts.tolist()):
+        if count == 0:
+            continue
+        insert_block(name, x0 + columns[first]*pitch_x, y0 + row*pitch_y, columns=count, column_spacing=pitch_x, layer=layer)
+    return centers, indices
+
 def straight_lines(
     x0: Union[int, float],
     y0: Union[int, float],
@@ -791,32 +2392,31 @@ def straight_lines(
     """
 
     N = len(widths)
+    if N == 0:
+        return []
+    widths = np.asarray(widths, dtype=float)
+    gaps = np.asarray(gaps, dtype=float)[:N-1]
+    # offset of line i = sum(widths[:i]) + sum(gaps[:i]) (prefix sum)
+    starts = np.concatenate([[0], np.cumsum(widths[:-1] + gaps)])
+    lows = starts # left or bottom side of each line
+    highs = starts + widths # right or top side of each line
+    ones = np.ones(N)
     if parallel_axis == "x":
-        # define center_point coordinates with offset (x0,y0)
-        center_points = [0 for i in range(N)]
-        for i in range(N):
-            x = x0 + length/2
-            y = y0 + sum(widths[:i]) + sum(gaps[:i]) + widths[i]/2 # widths[0~(i-1)] + widths[i]/2
-            center_points[i] = [x, y] # single line i
-
-        # define point coordinates
-        points = [0 for i in range(4*N)]
-        for i in range(N):
-            points[4*i+0 : 4*i+4]  = square(center_points[i][0], center_points[i][1], length, widths[i], xy0_position="center", layer=layer)
-
+        left, right = x0*ones, (x0 + length)*ones
+        bottom, top = y0 + lows, y0 + highs
     elif parallel_axis == "y":
-        # define center_point coordinates with offset (x0,y0)
-        center_points = [0 for i in range(N)]
-        for i in range(N):
-            y = y0 + length/2
-            x = x0 + sum(widths[:i]) + sum(gaps[:i]) + widths[i]/2 # widths[0~(i-1)] + widths[i]/2
-            center_points[i] = [x, y] # single line i
-
-        # define point coordinates
-        points = [0 for i in range(4*N)]
-        for i in range(N):
-            points[4*i+0 : 4*i+4]  = square(center_points[i][0], center_points[i][1], widths[i], length, xy0_position="center", layer=layer)
-    return points
+        left, right = x0 + lows, x0 + highs
+        bottom, top = y0*ones, (y0 + length)*ones
+
+    # define point coordinates (p0: top left, p1: bottom left, p2: bottom right, p3: top right of each line)
+    points = np.stack([
+        np.stack([left, top], axis=1),
+        np.stack([left, bottom], axis=1),
+        np.stack([right, bottom], axis=1),
+        np.stack([right, top], axis=1),
+    ], axis=1) # (N,4,2)
+    polylines(points, layer)
+    return Points(points.reshape(-1, 2))
 
 def bend_1(
     x0: Union[int, float],
@@ -853,14 +2453,14 @@ def bend_1(
 
     # define point coordinates
     N = len(r1s) # number of annular sectors
-    points = [0 for i in range(3+4*N)] # circular sector has 3 points instead of 4
+    parts = [0 for i in range(1+N)] # circular sector has 3 points instead of 4
     # circular sector
-    points[0:3] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
+    parts[0] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
             
     # annular sectors
     for i in range(N):
-        points[4*i+3 : 4*(i+1)+3] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
-    return points
+        parts[i+1] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+    return Points.concatenate(parts)
 
 def bend_2(
     x0: Union[int, float],
@@ -895,11 +2495,11 @@ def bend_2(
     """
     
     N = len(r1s)
-    points = [0 for i in range(4*N)]
+    parts = [0 for i in range(N)]
     # annular sectors
     for i in range(N):
-        points[4*i : 4*(i+1)] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
-    return points
+        parts[i] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+    return Points.concatenate(parts)
 
 def bend_3(
     x0: Union[int, float],
@@ -941,19 +2541,19 @@ def bend_3(
 
     # define point coordinates
     N = len(r1s) # number of annular sectors
-    points = [0 for i in range(4+4*N)] # circular sector has 3 points instead of 4, outer square has 5 points instead of 4
+    parts = [0 for i in range(1+N)] # circular sector has 3 points instead of 4, outer square has 5 points instead of 4
     # circular sector
-    points[0:3] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
+    parts[0] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
             
     # annular sectors
     for i in range(N-1):
-        points[4*i+3 : 4*(i+1)+3] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+        parts[i+1] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
     
     # annular square
     i = N-1
-    points[4*i+3 : 4*(i+1)+4] = annular_square_1(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+    parts[i+1] = annular_square_1(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
 
-    return points
+    return Points.concatenate(parts)
 
 def bend_4(
     x0: Union[int, float],
@@ -995,19 +2595,19 @@ def bend_4(
 
     # define point coordinates
     N = len(r1s) # number of annular sectors
-    points = [0 for i in range(3+4*N)] # circular sector has 3 points instead of 4, outer square has 4 points
+    parts = [0 for i in range(1+N)] # circular sector has 3 points instead of 4, outer square has 4 points
     # circular sector
-    points[0:3] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
+    parts[0] = circular_sector(x0,y0,r,angle1,angle2,layer=layer)
             
     # annular sectors
     for i in range(N-1):
-        points[4*i+3 : 4*(i+1)+3] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+        parts[i+1] = annular_sector(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
     
     # annular square
     i = N-1
-    points[4*i+3 : 4*(i+1)+3] = annular_square_2(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
+    parts[i+1] = annular_square_2(x0,y0,r1s[i],r2s[i],angle1,angle2,layer=layer)
 
-    return points
+    return Points.concatenate(parts)
 
 def tapers(
     x0: Union[int, float],
@@ -1084,24 +2684,602 @@ def tapers(
         left_width2s = width2s[:center]
         center_width2 = width2s[center]
         left_offset2 = -(sum(left_width2s) + sum(left_gap2s) + center_width2/2)
-    points = [0 for i in range(4*N)]
-    top_left_offsets = [0 for i in range(N)]
-    bottom_left_offsets = [0 for i in range(N)]
-    top_bottom_offsets = [0 for i in range(N)]
-    for i in range(N): # calculate offset between top and bottom centers
-        top_left_offsets[i] = left_offset1 + sum(width1s[:i]) + sum(gap1s[:i])
-        bottom_left_offsets[i] = left_offset2 + sum(width2s[:i]) + sum(gap2s[:i])
-        top_bottom_offsets[i] = top_left_offsets[i] - bottom_left_offsets[i] + (width1s[i]-width2s[i])/2
-    for i in range(N):
-        top_width, bottom_width = width1s[i], width2s[i]
-        widths = [top_width, bottom_width]
-        if (parallel_axis == "x"):
-            points[4*i : 4*(i+1)] = trapezoid(x0+bottom_left_offsets[i],y0,widths,top_bottom_offsets[i],height,xy0_position="bottom_left",parallel_axis="x",layer=layer)
-        elif (parallel_axis == "y"):
-            points[4*i : 4*(i+1)] = trapezoid(x0,y0+bottom_left_offsets[i],widths,top_bottom_offsets[i],height,xy0_position="left_top",parallel_axis="y",layer=layer)
+    # calculate offset between top and bottom centers (prefix sums of widths and gaps)
+    x1s, x2s = np.asarray(width1s[:N], dtype=float), np.asarray(width2s[:N], dtype=float)
+    top_left_offsets = left_offset1 + np.concatenate([[0], np.cumsum(x1s[:-1] + np.asarray(gap1s[:N-1], dtype=float))])
+    bottom_left_offsets = left_offset2 + np.concatenate([[0], np.cumsum(x2s[:-1] + np.asarray(gap2s[:N-1], dtype=float))])
+    x12s = top_left_offsets - bottom_left_offsets + (x1s - x2s)/2 # top center - bottom center
+    ones = np.ones(N)
+    if (parallel_axis == "x"): # same as trapezoid(xy0_position="bottom_left", parallel_axis="x") for each line
+        sx, sy = x0 + bottom_left_offsets, y0*ones
+        points = np.stack([
+            np.stack([sx + x2s/2 + x12s - x1s/2, sy + height], axis=1),
+            np.stack([sx, sy], axis=1),
+            np.stack([sx + x2s, sy], axis=1),
+            np.stack([sx + x2s/2 + x12s + x1s/2, sy + height], axis=1),
+        ], axis=1) # (N,4,2)
+    elif (parallel_axis == "y"): # same as trapezoid(xy0_position="left_top", parallel_axis="y") for each line
+        sx, sy = x0*ones, y0 + bottom_left_offsets
+        points = np.stack([
+            np.stack([sx, sy], axis=1),
+            np.stack([sx, sy - x2s], axis=1),
+            np.stack([sx + height, sy - x2s/2 + x12s - x1s/2], axis=1),
+            np.stack([sx + height, sy - x2s/2 + x12s + x1s/2], axis=1),
+        ], axis=1) # (N,4,2)
+    polylines(points, layer)
+    return Points(points.reshape(-1, 2))
+
+def bounding_box(
+    VerticesList: list,
+    bulges: Union[list, None] = None,
+):
+    """[exact bounding box of closed polyline including bulged arcs]
+
+    Args:
+        VerticesList ([float 2d list]): [coordinates of the polyline]
+        bulges (list, optional): [bulge of each vertex]. Defaults to None.
+
+    Returns:
+        [list]: [xmin, ymin, xmax, ymax]
+    """
+    vertices = np.asarray(VerticesList, dtype=float).reshape(-1, 2)
+    xmin, ymin = vertices.min(axis=0)
+    xmax, ymax = vertices.max(axis=0)
+    if bulges is None:
+        return [xmin, ymin, xmax, ymax]
+    bulges = np.asarray(bulges, dtype=float)
+    arcs = np.nonzero(bulges)[0]
+    if len(arcs) == 0:
+        return [xmin, ymin, xmax, ymax]
+    b = bulges[arcs]
+    p1 = vertices[arcs]
+    p2 = vertices[(arcs+1) % len(vertices)] # segment of the last vertex closes the polyline
+    chord = p2 - p1
+    normal = np.stack([-chord[:, 1], chord[:, 0]], axis=1) # left normal (length = chord)
+    centers = (p1 + p2)/2 + normal*((1 - b**2)/(4*b))[:, None]
+    radii = np.hypot(*(p1 - centers).T)
+    start = np.arctan2(*(p1 - centers)[:, ::-1].T)
+    sweeps = 4*np.arctan(b) # signed included angle (positive: counter clockwise)
+    for k, (dx, dy) in enumerate([(1, 0), (0, 1), (-1, 0), (0, -1)]): # extreme points at 0, pi/2, pi, 3pi/2
+        # angle from the arc start to the extreme point in the direction of the arc
+        delta = np.where(sweeps > 0, (k*pi/2 - start) % (2*pi), (start - k*pi/2) % (2*pi))
+        inside = delta <= np.abs(sweeps)
+        if inside.any():
+            xs = centers[inside, 0] + dx*radii[inside]
+            ys = centers[inside, 1] + dy*radii[inside]
+            xmin, ymin = min(xmin, xs.min()), min(ymin, ys.min())
+            xmax, ymax = max(xmax, xs.max()), max(ymax, ys.max())
+    return [xmin, ymin, xmax, ymax]
+
+def save_entities(
+    entities: list,
+    path: str,
+):
+    """[save [vertices, layer, bulges] polylines (see RecordWriter) to a new dxf file]
 
+    Args:
+        entities (list): [polylines]
+        path (str): [path of dxf file]
+    """
+    import ezdxf
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    for VerticesList, layer, bulges in entities:
+        if layer is not None and layer not in doc.layers:
+            doc.layers.add(name=layer)
+        if bulges is None:
+            bulges = [0 for i in range(len(VerticesList))]
+        polyline_obj = msp.add_lwpolyline([[x,y,0.001,0.001,bulge] for [x,y],bulge in zip(VerticesList, bulges)], dxfattribs={'layer': layer or "0"})
+        polyline_obj.closed = True
+    doc.saveas(path)
+
+def sweep_variant(
+    shape,
+    parameters: dict,
+    layer: Union[str, None] = None,
+    grid: Union[int, float, None] = None,
+    path: Union[str, None] = None,
+):
+    """[generate one variant of sweep() at (0,0) with the record writer (runs in worker processes)]
+
+    Returns:
+        [list]: [[vertices, layer, bulges] polylines]
+    """
+    state = {name: globals().get(name) for name in ["msp", "writer_", "doc", "path", "backend", "deduplicator", "block_", "enclosing_blocks_", "grid_", "extents_", "block_extents_", "fracture_", "window_"]}
+    try: # the caller's writer is restored if run in the main process (processes=1)
+        init(writer="record", grid=grid)
+        shape(0, 0, layer=layer, **parameters)
+        entities = backend.entities
+    finally:
+        globals().update(state)
+    if path is not None:
+        save_entities(entities, path)
+    return entities
+
+def sweep(
+    shape,
+    parameters: dict,
+    x0: Union[int, float] = 0.0,
+    y0: Union[int, float] = 0.0,
+    columns: Union[int, None] = None,
+    margin: Union[int, float, None] = None,
+    labels: bool = True,
+    font_data: Union[dict, None] = None,
+    label_height: Union[int, float, None] = None,
+    layer: Union[str, None] = None,
+    processes: Union[int, None] = None,
+    directory: Union[str, None] = None,
+):
+    """[generate device variants for every combination of parameters and lay them out in a grid]
+
+    variants are generated in a process pool with the record writer.
+    the grid pitch is the largest variant size (or label width) + margin, variant i is placed at column i % columns, row i // columns.
+    label "name=value, ..." is written above each variant.
+
+    row 1: [variant 3] [variant 4]
+    row 0: [variant 0] [variant 1] [variant 2]
+           (x0,y0)
+
+    Args:
+        shape ([function]): [shape function with x0, y0 as first parameters (e.g. tapers, bend_1)]
+        parameters (dict): [{parameter name: list of values}]
+        x0 (float, optional): [bottom left x coordinate of the grid]. Defaults to 0.0.
+        y0 (float, optional): [bottom left y coordinate of the grid]. Defaults to 0.0.
+        columns (int, optional): [number of columns]. Defaults to None (square grid).
+        margin (float, optional): [space between variants]. Defaults to None (20% of largest variant).
+        labels (bool, optional): [write parameters of each variant]. Defaults to True.
+        font_data (dict, optional): [font data for labels]. Defaults to None (load_font()).
+        label_height (float, optional): [height of labels]. Defaults to None (half of margin).
+        layer (str, optional): [layer of the variants and labels]. Defaults to None.
+        processes (int, optional): [number of worker processes (1: no pool)]. Defaults to None (number of cpus).
+        directory (str, optional): [also write each variant to directory/{shape name}_{index}.dxf]. Defaults to None.
+
+    Returns:
+        [tuple]: [list of parameters of each variant, (N,2) array of x,y offsets of each variant]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    names = list(parameters)
+    variants = [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+    paths = [None for variant in variants]
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, f"{shape.__name__}_{i:04d}.dxf") for i in range(len(variants))]
+    arguments = [[shape for variant in variants], variants, [layer for variant in variants], [grid_ for variant in variants], paths]
+    if processes == 1:
+        results = list(map(sweep_variant, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(sweep_variant, *arguments, chunksize=max(1, len(variants)//(4*(os.cpu_count() or 1)))))
+
+    # grid layout
+    boxes = np.array([
+        [np.min([bounding_box(vertices, bulges)[:2] for vertices, _, bulges in entities], axis=0).tolist()
+         + np.max([bounding_box(vertices, bulges)[2:] for vertices, _, bulges in entities], axis=0).tolist()]
+        if entities else [[0, 0, 0, 0]]
+        for entities in results
+    ]).reshape(-1, 4)
+    sizes = boxes[:, 2:] - boxes[:, :2]
+    cell = sizes.max(axis=0)
+    if margin is None:
+        margin = 0.2*cell.max()
+    if labels and label_height is None:
+        label_height = margin/2
+    pitch = cell + margin + [0, label_height if labels else 0]
+    if labels:
+        if font_data is None:
+            font_data = load_font()
+        strings = [", ".join(f"{name}={value:g}" if isinstance(value, float) else f"{name}={value}" for name, value in variant.items()) for variant in variants]
+        pitch[0] = max(cell[0], text_widths(strings, label_height, font_data).max()) + margin # labels don't overlap the next column
+    if columns is None:
+        columns = int(np.ceil(np.sqrt(len(variants))))
+    indices = np.arange(len(variants))
+    corners = np.stack([x0 + indices % columns*pitch[0], y0 + indices // columns*pitch[1]], axis=1)
+    offsets = corners - boxes[:, :2] # move bottom left of each variant to its cell corner
+    for entities, offset in zip(results, offsets):
+        for vertices, entity_layer, bulges in entities:
+            emit((np.asarray(vertices, dtype=float) + offset).tolist(), entity_layer, bulges)
+    if labels:
+        texts(corners + [0, cell[1] + margin/4], strings, label_height, font_data, layer=layer)
+    return variants, offsets
+
+# transforms
+
+def affine(
+    rotation: Union[int, float] = 0.0,
+    mirror: Union[str, None] = None,
+    scale: Union[int, float] = 1.0,
+    dx: Union[int, float] = 0.0,
+    dy: Union[int, float] = 0.0,
+    x0: Union[int, float] = 0.0,
+    y0: Union[int, float] = 0.0,
+):
+    """[3x3 affine matrix: scale, mirror and rotate around (x0,y0), then translate by (dx,dy)]
+
+    matrices can be combined with @ (e.g. affine(dx=100) @ affine(rotation=pi/2) rotates first).
+
+    Args:
+        rotation (float, optional): [rotation angle (counter clockwise)]. Defaults to 0.0.
+        mirror (str, optional): ["x" (flip x coordinates) or "y" (flip y coordinates)]. Defaults to None.
+        scale (float, optional): [magnification ratio]. Defaults to 1.0.
+        dx (float, optional): [x translation]. Defaults to 0.0.
+        dy (float, optional): [y translation]. Defaults to 0.0.
+        x0 (float, optional): [x coordinate of the fixed point of scale, mirror and rotation]. Defaults to 0.0.
+        y0 (float, optional): [y coordinate of the fixed point of scale, mirror and rotation]. Defaults to 0.0.
+
+    Returns:
+        [array]: [3x3 matrix (applied to column vectors [x, y, 1])]
+    """
+    flips = {None: [1, 1], "x": [-1, 1], "y": [1, -1]}
+    linear = np.array([[cos(rotation), -sin(rotation)], [sin(rotation), cos(rotation)]]) @ np.diag(flips[mirror])*scale
+    matrix = np.eye(3)
+    matrix[:2, :2] = linear
+    matrix[:2, 2] = [x0 + dx, y0 + dy] - linear @ [x0, y0]
+    return matrix
+
+@contextmanager
+def group():
+    """[capture polylines written inside the with block instead of writing them]
+
+    with group() as entities:
+        tapers(0, 0, ...)
+        bend_1(0, 0, ...)
+    emit_entities(transform(entities, affine(rotation=pi/2)))
+
+    only polylines are captured (use texts(blocks=False) for labels).
+
+    Yields:
+        [list]: [[vertices, layer, bulges] polylines (filled when the with block exits)]
+    """
+    entities = []
+    state = {name: globals().get(name) for name in ["msp", "writer_", "doc", "path", "backend", "deduplicator", "block_", "enclosing_blocks_", "grid_", "extents_", "block_extents_", "fracture_", "window_"]}
+    try:
+        init(writer="record", grid=grid_)
+        recorder = backend
+        yield entities
+    finally:
+        globals().update(state)
+    if recorder.inserts:
+        print(f"{len(recorder.inserts)} block inserts in group() are not captured")
+    entities.extend(recorder.entities)
+
+def transform(
+    entities: list,
+    matrix: np.ndarray,
+):
+    """[apply affine matrix to the vertices of all polylines with one matrix product]
+
+    bulges are negated if the matrix mirrors. arcs can't be scaled non-uniformly (they would become ellipses).
+
+    Args:
+        entities (list): [[vertices, layer, bulges] polylines (e.g. from group())]
+        matrix ([array]): [3x3 matrix (see affine())]
+
+    Returns:
+        [list]: [transformed [vertices, layer, bulges] polylines]
+    """
+    if not entities:
+        return []
+    matrix = np.asarray(matrix, dtype=float)
+    linear = matrix[:2, :2]
+    determinant = np.linalg.det(linear)
+    similar = np.allclose(linear.T @ linear, abs(determinant)*np.eye(2)) # rotation, mirror and uniform scale only
+    if not similar and any(bulges is not None and any(bulges) for _, _, bulges in entities):
+        raise ValueError("bulged polylines can only be transformed with rotation, mirror, uniform scale and translation")
+    counts = [len(vertices) for vertices, _, _ in entities]
+    vertices = np.concatenate([np.asarray(vertices, dtype=float).reshape(-1, 2) for vertices, _, _ in entities])
+    vertices = vertices @ linear.T + matrix[:2, 2]
+    transformed = []
+    for VerticesList, (_, layer, bulges) in zip(np.split(vertices, np.cumsum(counts)[:-1]), entities):
+        if bulges is not None and determinant < 0: # mirror reverses the direction of arcs
+            bulges = [-bulge for bulge in bulges]
+        transformed.append([VerticesList.tolist(), layer, bulges])
+    return transformed
+
+def emit_entities(
+    entities: list,
+):
+    """[write [vertices, layer, bulges] polylines (e.g. from transform())]
+
+    Args:
+        entities (list): [polylines]
+    """
+    for VerticesList, layer, bulges in entities:
+        emit(VerticesList, layer, bulges)
+
+# deferred layout graph
+
+def item(
+    value,
+    index,
+):
+    """[value[index] (used by Node[index])]
+    """
+    return value[index]
+
+class Node:
+    """[deferred shape call in a Layout (evaluated by Layout.run() only if its inputs changed)]
+
+    nodes can be passed as parameters of other nodes (replaced by their return value).
+    node[index] is a node of an item of the return value (e.g. node[3][0] is x of point p3).
+    """
+    def __init__(self, layout, name, shape, args, kwargs):
+        self.layout = layout
+        self.name = name
+        self.shape = shape
+        self.args = args
+        self.kwargs = kwargs
+        self.key = None # build_key() of the shape call (set by Layout.run())
+        self.value = None # return value of the shape call
+        self.handles = [] # handles of entities written by the shape call
+
+    def __getitem__(self, index):
+        return self.layout.add(item, self, index, name=f"{self.name}[{index!r}]")
+
+class Layout:
+    """[deferred layout: shape calls build a graph of nodes, and run() regenerates only changed nodes into an existing dxf file]
+
+    layout = Layout("chip.dxf")
+    layout.add_layers(["layer0"])
+    taper = layout.tapers(0, 0, 100, [1, 1], [2], [3, 3], [4], layer="layer0")
+    layout.square(taper[0][0], 200, 10, 10, layer="layer0") # depends on taper
+    layout.run()
+
+    the key, return value and entity handles of each node are kept in {dxf file}.nodes next to the dxf file
+    (new relative filenames are written to the test directory like init(writer="ezdxf")).
+    on the next run(), nodes with the same key (same shape, parameters and dependencies) are not evaluated,
+    the entities of changed or removed nodes are deleted and changed nodes are written again.
+    nodes are named {shape name}_{call index} unless name= is given, so names are stable if the script is rerun.
+
+    Args:
+        filename (str): [dxf file]
+        font_path (str, optional): [path of font data pickle file (part of the node keys)]. Defaults to "font_data.pickle".
+    """
+    def __init__(
+        self,
+        filename: str,
+        font_path: str = "font_data.pickle",
+    ):
+        self.filename = filename
+        self.font_path = font_path
+        self.nodes = {} # name: node (in call order, dependencies come first)
+        self.counts = {} # shape name: number of calls
+
+    def add(self, shape, *args, name=None, **kwargs):
+        """[add deferred call shape(*args, **kwargs) to the graph]
+
+        Returns:
+            [Node]: [node of the call]
+        """
+        if name is None:
+            index = self.counts.get(shape.__name__, 0)
+            self.counts[shape.__name__] = index + 1
+            name = f"{shape.__name__}_{index}"
+        if name not in self.nodes:
+            self.nodes[name] = Node(self, name, shape, args, kwargs)
+        return self.nodes[name]
+
+    def __getattr__(self, name): # layout.tapers(...) == layout.add(tapers, ...)
+        shape = globals().get(name)
+        if not callable(shape):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.add(shape, *args, **kwargs)
+
+    def run(self, **options):
+        """[evaluate changed nodes and write them into the dxf file]
+
+        Args:
+            options: [parameters of init() (writer is always "ezdxf")]
+
+        Returns:
+            [list]: [names of evaluated nodes]
+        """
+        import pickle
+        dxf_path = EzdxfWriter.output_path(self.filename)
+        state_path = f"{dxf_path}.nodes"
+        state = {}
+        if os.path.isfile(state_path) and os.path.isfile(dxf_path):
+            with open(state_path, "rb") as f:
+                state = pickle.load(f)
+            init(writer="ezdxf", filename=dxf_path, **options)
+        else:
+            init(writer="ezdxf", filename=dxf_path, reset=True, **options)
+        entitydb = doc.entitydb
+
+        def delete(handles):
+            for handle in handles:
+                entity = entitydb.get(handle)
+                if entity is not None and entity.is_alive:
+                    msp.delete_entity(entity)
+
+        def resolve(value, keyed): # replace nodes by their return value (or key)
+            if isinstance(value, Node):
+                return ("node", value.key) if keyed else value.value
+            if isinstance(value, (list, tuple)):
+                return type(value)(resolve(element, keyed) for element in value)
+            if isinstance(value, dict):
+                return {name: resolve(element, keyed) for name, element in value.items()}
+            return value
+
+        evaluated = []
+        for name, node in self.nodes.items():
+            node.key = build_key(node.shape, resolve(node.args, True), resolve(node.kwargs, True), self.font_path)
+            old = state.pop(name, None)
+            if old is not None and old["key"] == node.key and all(handle in entitydb for handle in old["handles"]):
+                node.value, node.handles = old["value"], old["handles"]
+                continue
+            if old is not None:
+                delete(old["handles"])
+            backend.handles = node.handles = [] # filled by the writer while the shape is written
+            node.value = node.shape(*resolve(node.args, False), **resolve(node.kwargs, False))
+            evaluated.append(name)
+        backend.handles = None
+        for old in state.values(): # nodes removed from the graph
+            delete(old["handles"])
+        end()
+
+        temporary_path = state_path + ".acs_tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump({name: {"key": node.key, "value": node.value, "handles": node.handles} for name, node in self.nodes.items()}, f)
+        os.replace(temporary_path, state_path)
+        print(f"evaluated {len(evaluated)} of {len(self.nodes)} nodes")
+        return evaluated
+
+
+# trapezoid fracturing
+
+def tessellate(
+    VerticesList: list,
+    bulges: Union[list, None] = None,
+    tolerance: Union[int, float] = 0.01,
+):
+    """[replace bulged arcs of closed polyline by chords]
+
+    Args:
+        VerticesList ([float 2d list]): [coordinates of the polyline]
+        bulges (list, optional): [bulge of each vertex]. Defaults to None.
+        tolerance (float, optional): [max distance between arc and chord]. Defaults to 0.01.
+
+    Returns:
+        [array]: [(N,2) coordinates of the polygon]
+    """
+    vertices = np.asarray(VerticesList, dtype=float).reshape(-1, 2)
+    if bulges is None or not np.any(bulges):
+        return vertices
+    N = len(vertices)
+    parts = []
+    for i, bulge in enumerate(bulges):
+        parts.append(vertices[i:i+1])
+        p1, p2 = vertices[i], vertices[(i+1) % N] # segment of the last vertex closes the polyline
+        chord = p2 - p1
+        length = np.hypot(*chord)
+        if bulge == 0 or length == 0:
+            continue
+        center = (p1 + p2)/2 + np.array([-chord[1], chord[0]])*(1 - bulge**2)/(4*bulge)
+        r = length*(1 + bulge**2)/(4*abs(bulge))
+        sweep_angle = 4*atan(bulge) # signed included angle
+        step = 2*np.arccos(max(-1.0, 1 - tolerance/r)) # largest angle of a chord within tolerance
+        n = max(1, int(np.ceil(abs(sweep_angle)/step)))
+        angles = np.arctan2(p1[1] - center[1], p1[0] - center[0]) + sweep_angle*np.arange(1, n)/n
+        parts.append(center + r*np.stack([np.cos(angles), np.sin(angles)], axis=1))
+    return np.concatenate(parts)
+
+def fracture(
+    VerticesList: list,
+    bulges: Union[list, None] = None,
+    tolerance: Union[int, float] = 0.01,
+):
+    """[decompose closed polyline into trapezoids with horizontal top and bottom sides (sweep line)]
+
+    the sweep line stops at the y coordinate of every vertex. in each slab, the edges crossing the slab are sorted by x
+    and the intervals with nonzero winding number become trapezoids.
+    a trapezoid is extended into the next slab while it is bounded by the same two edges,
+    so only vertices of the polygon itself split trapezoids.
+    repeated vertices and vertices between collinear edges are removed first (they don't split trapezoids).
+
+    Args:
+        VerticesList ([float 2d list]): [coordinates of the polyline]
+        bulges (list, optional): [bulge of each vertex]. Defaults to None.
+        tolerance (float, optional): [tessellation tolerance of arcs]. Defaults to 0.01.
+
+    Returns:
+        [list]: [vertices of each trapezoid (bottom left, bottom right, top right, top left, 3 vertices for triangles)]
+    """
+    vertices = tessellate(VerticesList, bulges, tolerance)
+    vertices = vertices[np.any(vertices != np.roll(vertices, 1, axis=0), axis=1)] # repeated vertices
+    if len(vertices) > 2: # vertices between collinear edges of the same direction
+        incoming, outgoing = vertices - np.roll(vertices, 1, axis=0), np.roll(vertices, -1, axis=0) - vertices
+        cross_products = incoming[:, 0]*outgoing[:, 1] - incoming[:, 1]*outgoing[:, 0]
+        scale = np.abs(incoming).max(axis=1)*np.abs(outgoing).max(axis=1)
+        straight = (np.abs(cross_products) <= 1e-12*scale) & ((incoming*outgoing).sum(axis=1) > 0)
+        vertices = vertices[~straight]
+    p1, p2 = vertices, np.roll(vertices, -1, axis=0)
+    sloped = p1[:, 1] != p2[:, 1] # horizontal edges don't bound trapezoids
+    p1, p2 = p1[sloped], p2[sloped]
+    if len(p1) < 2:
+        return []
+    directions = np.where(p2[:, 1] > p1[:, 1], 1, -1)
+    upward = (p2[:, 1] > p1[:, 1])[:, None]
+    bottoms, tops = np.where(upward, p1, p2), np.where(upward, p2, p1)
+    slopes = (tops[:, 0] - bottoms[:, 0])/(tops[:, 1] - bottoms[:, 1]) # dx/dy
+
+    trapezoids = [] # [y bottom, y top, x bottom left, x bottom right, x top left, x top right]
+    opened = {} # (left edge, right edge): index of trapezoid ending at the current slab
+    ys = np.unique(vertices[:, 1])
+    for ya, yb in zip(ys[:-1].tolist(), ys[1:].tolist()):
+        active = np.nonzero((bottoms[:, 1] <= ya) & (tops[:, 1] >= yb))[0]
+        xa = bottoms[active, 0] + slopes[active]*(ya - bottoms[active, 1])
+        xb = bottoms[active, 0] + slopes[active]*(yb - bottoms[active, 1])
+        order = np.argsort(xa + xb, kind="stable")
+        active, xa, xb = active[order].tolist(), xa[order].tolist(), xb[order].tolist()
+        winding = np.cumsum(directions[active])
+        continued = {}
+        for i in np.nonzero(winding[:-1] != 0)[0].tolist():
+            edges = (active[i], active[i+1])
+            if edges in opened: # same edges as in the slab below: extend the trapezoid
+                index = opened[edges]
+                trapezoids[index][1], trapezoids[index][4], trapezoids[index][5] = yb, xb[i], xb[i+1]
+            else:
+                index = len(trapezoids)
+                trapezoids.append([ya, yb, xa[i], xa[i+1], xb[i], xb[i+1]])
+            continued[edges] = index
+        opened = continued
+
+    points = []
+    for ya, yb, xa1, xa2, xb1, xb2 in trapezoids:
+        trapezoid = [[xa1, ya], [xa2, ya], [xb2, yb], [xb1, yb]]
+        if xa1 == xa2:
+            del trapezoid[1]
+        elif xb1 == xb2:
+            del trapezoid[3]
+        points.append(trapezoid)
     return points
 
+def fracture_dxf(
+    path: str,
+    output_path: Union[str, None] = None,
+    tolerance: Union[int, float] = 0.01,
+):
+    """[write every closed LWPOLYLINE of a dxf file (block inserts exploded) as trapezoids to a new dxf file]
+
+    Args:
+        path (str): [path of dxf file]
+        output_path (str, optional): [path of fractured dxf file]. Defaults to None ({path without extension}_fractured.dxf).
+        tolerance (float, optional): [tessellation tolerance of arcs]. Defaults to 0.01.
+
+    Returns:
+        [dict]: [number of trapezoids of each layer]
+    """
+    import ezdxf
+    source = ezdxf.readfile(path)
+    if output_path is None:
+        output_path = f"{os.path.splitext(path)[0]}_fractured.dxf"
+    target = ezdxf.new(source.dxfversion)
+    target_msp = target.modelspace()
+    counts = {}
+
+    def polygons(entities, insert_layer=None):
+        for entity in entities:
+            if entity.dxftype() == "INSERT":
+                for insert in entity.multi_insert():
+                    yield from polygons(insert.virtual_entities(), entity.dxf.layer)
+            elif entity.dxftype() == "LWPOLYLINE" and entity.closed:
+                layer = insert_layer if insert_layer is not None and entity.dxf.layer == "0" else entity.dxf.layer
+                yield layer, entity.get_points("xyb")
+
+    for layer, points in polygons(source.modelspace()):
+        if layer not in target.layers:
+            target.layers.add(name=layer)
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        trapezoids = fracture(points[:, :2], points[:, 2].tolist(), tolerance)
+        for trapezoid in trapezoids:
+            polyline_obj = target_msp.add_lwpolyline(trapezoid, format="xy", dxfattribs={"layer": layer})
+            polyline_obj.closed = True
+        counts[layer] = counts.get(layer, 0) + len(trapezoids)
+    target.saveas(output_path)
+    for layer, count in counts.items():
+        print(f"{layer}: {count} trapezoids")
+    return counts
+
 if __name__ == "__main__":
     init(writer="ezdxf")
     add_layers(["layer0"])
@@ -1120,4 +3298,4 @@ if __name__ == "__main__":
     text(0,0,100,"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ", font_data,layer="layer0")
     text(0,150,100,"1234567890-^\@[;:],./\\=~|`{+*}<>?_", font_data,layer="layer0")
     text(0,300,100,"あいうえおかきくけこさしすせそなにぬねのはひふへほまみむめもやゆよわをん", font_data,layer="layer0")
-    end()
\ No newline at end of file
+    end()
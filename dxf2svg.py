@@ -4,46 +4,293 @@ from ezdxf.addons.drawing import RenderContext, Frontend
 from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
 from ezdxf.addons.drawing.properties import Properties, LayoutProperties
 from ezdxf.addons.drawing.config import Configuration
+import xml.etree.ElementTree as ET
+import hashlib
+import io
+import math
 import re
 import os
 
+SVG_NS = "http://www.w3.org/2000/svg"
+for prefix, uri in [("", SVG_NS), ("xlink", "http://www.w3.org/1999/xlink"), ("dc", "http://purl.org/dc/elements/1.1/"), ("cc", "http://creativecommons.org/ns#"), ("rdf", "http://www.w3.org/1999/02/22-rdf-syntax-ns#")]:
+    ET.register_namespace(prefix, uri)
+handle_codes = {5, 105, 330, 340, 350, 360} # group codes of handles and pointers (change when entities are written again)
+
 # DXF
-def parse_autocad(path, save_path):
+def parse_autocad(path, save_path, cache_dir=None, processes=1, tiles=None):
+    """[render modelspace of dxf file to svg]
+
+    with cache_dir, processes != 1 or tiles, the modelspace is split into groups (layers, or tiles if tiles=(columns, rows)).
+    each group is rendered to its own svg group, and the groups are overlaid in one svg file.
+    groups are rendered in a pool of processes (None: number of cpus), so each figure only holds the artists of one group
+    and each process only loads the entities of the group it renders (with the blocks and tables they use).
+    with cache_dir, rendered groups are cached in a subdirectory of cache_dir for each dxf file,
+    keyed on a hash of the group's entities (and the blocks they insert),
+    and only groups whose entities changed since the last call are rendered again.
+    """
     # https://stackoverflow.com/questions/58906149/python-converting-dxf-files-to-pdf-or-png-or-jpeg
     print("parsing autocad")
 
     doc = ezdxf.readfile(path)
     msp = doc.modelspace()
+    if cache_dir is not None or processes != 1 or tiles is not None:
+        return parse_autocad_groups(doc, path, save_path, cache_dir, processes, tiles)
+    audit(doc)
+    fig = plt.figure()
+    ctx = RenderContext(doc)
+    # Better control over the LayoutProperties used by the drawing frontend
+    layout_properties = LayoutProperties.from_layout(msp)
+    layout_properties.set_colors(bg='#000000')
+    ax = fig.add_axes([0, 0, 1, 1])
+    out = MatplotlibBackend(ax)
+    Frontend(ctx, out, config=render_config()).draw_layout(msp, layout_properties=layout_properties, finalize=True)
+    fig.savefig(save_path, format="svg")
+    svg_fill(save_path)
+
+def audit(doc):
     # Recommended: audit & repair DXF document before rendering
     auditor = doc.audit()
     # The auditor.errors attribute stores severe errors,
     # which *may* raise exceptions when rendering.
     if len(auditor.errors) != 0:
         raise Exception("The DXF document is damaged and can't be converted!")
-    else :
-        fig = plt.figure()
-        ctx = RenderContext(doc)
-        # Better control over the LayoutProperties used by the drawing frontend
-        layout_properties = LayoutProperties.from_layout(msp)
-        layout_properties.set_colors(bg='#000000')
-        ax = fig.add_axes([0, 0, 1, 1])
-        out = MatplotlibBackend(ax)
-        config = Configuration.defaults()
-        config = config.with_changes(lineweight_scaling=0, min_lineweight=0.02, hatch_policy="SHOW_SOLID")
-        Frontend(ctx, out, config=config).draw_layout(msp, layout_properties=layout_properties, finalize=True)
-        fig.savefig(save_path, format="svg")
-        svg_fill(save_path)
+
+def render_config():
+    config = Configuration.defaults()
+    return config.with_changes(lineweight_scaling=0, min_lineweight=0.02, hatch_policy="SHOW_SOLID")
+
+def render_limits(doc):
+    """[x and y limits of the rendered area ($EXTMIN/$EXTMAX if valid, otherwise all entities)]
+
+    like the plain render: 5% margins, and the short side is widened to the aspect of the figure
+    (plt.figaspect clamps the figure size of elongated drawings).
+    """
+    (x1, y1, _), (x2, y2, _) = doc.header.get("$EXTMIN", (1e20, 1e20, 1e20)), doc.header.get("$EXTMAX", (-1e20, -1e20, -1e20))
+    if not (x1 <= x2 and y1 <= y2):
+        from ezdxf import bbox
+        box = bbox.extents(doc.modelspace(), fast=True)
+        if not box.has_data:
+            return (0.0, 1.0), (0.0, 1.0)
+        (x1, y1, _), (x2, y2, _) = box.extmin, box.extmax
+    margin_x, margin_y = 0.05*(x2 - x1), 0.05*(y2 - y1) # same margins as matplotlib autoscale
+    (x1, x2), (y1, y2) = (x1 - margin_x, x2 + margin_x), (y1 - margin_y, y2 + margin_y)
+    if math.isclose(x2 - x1, 0) or math.isclose(y2 - y1, 0):
+        return (x1, x2), (y1, y2)
+    width, height = plt.figaspect((y2 - y1)/(x2 - x1))
+    scale = max((x2 - x1)/width, (y2 - y1)/height) # data units per inch (equal aspect)
+    center_x, center_y = (x1 + x2)/2, (y1 + y2)/2
+    return (center_x - scale*width/2, center_x + scale*width/2), (center_y - scale*height/2, center_y + scale*height/2)
+
+def render_svg(doc, limits, filter_func=None):
+    """[render modelspace entities accepted by filter_func with fixed limits (svg text)]
+
+    all renders with the same limits have the same size and transform, so their groups can be overlaid
+    (the limits are not adjusted to the data of the rendered entities).
+    """
+    msp = doc.modelspace()
+    fig = plt.figure()
+    ctx = RenderContext(doc)
+    layout_properties = LayoutProperties.from_layout(msp)
+    layout_properties.set_colors(bg='#000000')
+    ax = fig.add_axes([0, 0, 1, 1])
+    out = MatplotlibBackend(ax, adjust_figure=False)
+    Frontend(ctx, out, config=render_config()).draw_layout(msp, layout_properties=layout_properties, finalize=True, filter_func=filter_func)
+    (x1, x2), (y1, y2) = limits
+    if not math.isclose(x2 - x1, 0):
+        fig.set_size_inches(*plt.figaspect((y2 - y1)/(x2 - x1)), forward=True)
+        width, height = fig.get_size_inches()
+        if not math.isclose(width/height, (x2 - x1)/(y2 - y1), rel_tol=1e-6): # clamped (limits are not from render_limits())
+            fig.set_size_inches(width, width*(y2 - y1)/(x2 - x1), forward=True)
+    ax.set_aspect("auto") # the frontend sets equal aspect with adjustable data limits, which would override the limits
+    ax.set_xlim(x1, x2)
+    ax.set_ylim(y1, y2)
+    buffer = io.StringIO()
+    fig.savefig(buffer, format="svg")
+    plt.close(fig)
+    return "".join(fill_lines(buffer.getvalue().splitlines(keepends=True)))
+
+def entity_key(entity, dxfversion, block_keys):
+    """[hash of entity tags without handles (and of the inserted block)]
+    """
+    from ezdxf.lldxf.tagwriter import TagCollector
+    collector = TagCollector(dxfversion=dxfversion)
+    entity.export_dxf(collector)
+    key = hashlib.sha256(repr([(tag.code, tag.value) for tag in collector.tags if tag.code not in handle_codes]).encode())
+    if entity.dxftype() == "INSERT":
+        key.update(block_key(entity.doc, entity.dxf.name, block_keys).encode())
+    return key.digest()
+
+def block_key(doc, name, block_keys):
+    """[hash of the entities of block (memoized in block_keys)]
+    """
+    if name not in block_keys:
+        block_keys[name] = "" # recursive inserts
+        key = hashlib.sha256(name.encode())
+        block = doc.blocks.get(name)
+        if block is not None:
+            for entity in block:
+                key.update(entity_key(entity, doc.dxfversion, block_keys))
+        block_keys[name] = key.hexdigest()
+    return block_keys[name]
+
+def entity_groups(doc, limits, tiles=None):
+    """[handles of modelspace entities in each render group ({layer: handles} or {(column, row): handles} of tiles)]
+
+    entities are assigned to the tile of the center of their bounding box
+    (entities without bounding box to the first tile, so tiles draw the same entities as the plain render).
+    """
+    groups = {}
+    if tiles is None:
+        for entity in doc.modelspace():
+            groups.setdefault(entity.dxf.layer, []).append(entity.dxf.handle)
+        return groups
+    from ezdxf import bbox
+    columns, rows = tiles
+    (x1, x2), (y1, y2) = limits
+    for entity in doc.modelspace():
+        box = bbox.extents([entity], fast=True)
+        if not box.has_data:
+            groups.setdefault((0, 0), []).append(entity.dxf.handle)
+            continue
+        x, y = box.center.x, box.center.y
+        column = min(max(int((x - x1)/(x2 - x1)*columns), 0), columns - 1) if x2 > x1 else 0
+        row = min(max(int((y - y1)/(y2 - y1)*rows), 0), rows - 1) if y2 > y1 else 0
+        groups.setdefault((column, row), []).append(entity.dxf.handle)
+    return groups
+
+def group_keys(doc, limits, groups):
+    """[hash of each render group (entities, inserted blocks, layer table, render limits and config)]
+    """
+    block_keys = {}
+    common = hashlib.sha256(repr((limits, render_config())).encode())
+    for layer in doc.layers:
+        common.update(entity_key(layer, doc.dxfversion, block_keys))
+    keys = {}
+    for name, handles in groups.items():
+        key = common.copy()
+        key.update(repr(name).encode())
+        for handle in handles:
+            key.update(entity_key(doc.entitydb[handle], doc.dxfversion, block_keys))
+        keys[name] = key.hexdigest()
+    return keys
+
+def group_fragment(doc, limits, name, handles, key):
+    """[render one group to a standalone svg with one group (id from key) and its clip paths]
+    """
+    handles = set(handles)
+    root = ET.fromstring(render_svg(doc, limits, lambda entity: entity.dxf.handle in handles).encode())
+    axes = root.find(f".//{{{SVG_NS}}}g[@id='axes_1']")
+    group = ET.Element(f"{{{SVG_NS}}}g", id=f"group_{key[:16]}")
+    ET.SubElement(group, f"{{{SVG_NS}}}title").text = name if isinstance(name, str) else f"tile {name[0]},{name[1]}"
+    for child in list(axes)[1:]: # first child is the background of the axes
+        for element in child.iter():
+            if "id" in element.attrib: # ids of matplotlib (patch_1, ...) are unique only within one render
+                element.set("id", f"{group.get('id')}_{element.get('id')}")
+        group.append(child)
+    fragment = ET.Element(f"{{{SVG_NS}}}svg")
+    defs = ET.SubElement(fragment, f"{{{SVG_NS}}}defs")
+    defs.extend(root.findall(f".//{{{SVG_NS}}}clipPath"))
+    fragment.append(group)
+    return ET.tostring(fragment, encoding="unicode")
+
+def group_dxf(doc, handles):
+    """[dxf text of a document with only the entities of one group (and the tables and blocks they use)]
+    """
+    from ezdxf.addons.importer import Importer
+    group_doc = ezdxf.new(doc.dxfversion)
+    importer = Importer(doc, group_doc)
+    importer.import_tables(["layers", "linetypes", "styles"])
+    importer.import_entities([doc.entitydb[handle] for handle in handles])
+    importer.finalize()
+    buffer = io.StringIO()
+    group_doc.write(buffer)
+    return buffer.getvalue()
+
+def render_worker_group(text, limits, name, key): # runs in render processes (only the group is loaded)
+    group_doc = ezdxf.read(io.StringIO(text))
+    audit(group_doc)
+    return group_fragment(group_doc, limits, name, [entity.dxf.handle for entity in group_doc.modelspace()], key)
+
+def compose_svg(background, fragments, save_path):
+    """[overlay groups of fragments on the background render and save svg]
+    """
+    root = ET.fromstring(background.encode())
+    axes = root.find(f".//{{{SVG_NS}}}g[@id='axes_1']")
+    defs = root.findall(f"{{{SVG_NS}}}defs")[-1]
+    clip_ids = {clip.get("id") for clip in root.iter(f"{{{SVG_NS}}}clipPath")}
+    for fragment in fragments:
+        fragment = ET.fromstring(fragment.encode())
+        for clip in fragment.iter(f"{{{SVG_NS}}}clipPath"):
+            if clip.get("id") not in clip_ids: # same limits give the same clip path
+                clip_ids.add(clip.get("id"))
+                defs.append(clip)
+        axes.append(fragment.find(f"{{{SVG_NS}}}g"))
+    ET.ElementTree(root).write(save_path, encoding="utf-8", xml_declaration=True)
+
+def parse_autocad_groups(doc, path, save_path, cache_dir=None, processes=1, tiles=None):
+    """[render svg from group fragments, rendering only groups that are not cached]
+    """
+    limits = render_limits(doc)
+    groups = entity_groups(doc, limits, tiles)
+    keys = group_keys(doc, limits, groups)
+    fragments = {}
+    if cache_dir is not None:
+        cache_dir = fragment_dir(cache_dir, path)
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, key in keys.items():
+            cache_path = os.path.join(cache_dir, f"{key}.svg")
+            if os.path.isfile(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    fragments[name] = f.read()
+    missing = [name for name in groups if name not in fragments]
+    if missing:
+        audit(doc)
+    if processes == 1 or len(missing) <= 1:
+        for name in missing:
+            fragments[name] = group_fragment(doc, limits, name, groups[name], keys[name])
+    else:
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        workers = processes or os.cpu_count()
+        queue, running = list(missing), {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while queue or running: # workers get the entities of their group only, at most 2 groups per worker are queued
+                while queue and len(running) < 2*workers:
+                    name = queue.pop(0)
+                    running[executor.submit(render_worker_group, group_dxf(doc, groups[name]), limits, name, keys[name])] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fragments[running.pop(future)] = future.result()
+    print(f"rendered {len(missing)} of {len(groups)} groups")
+
+    compose_svg(render_svg(doc, limits, lambda entity: False), [fragments[name] for name in groups], save_path)
+    if cache_dir is not None:
+        for name in missing:
+            with open(os.path.join(cache_dir, f"{keys[name]}.svg"), "w", encoding="utf-8") as f:
+                f.write(fragments[name])
+        used = {f"{key}.svg" for key in keys.values()}
+        for file_name in os.listdir(cache_dir): # fragments of old revisions
+            if re.fullmatch(r"[0-9a-f]{64}\.svg", file_name) and file_name not in used:
+                os.remove(os.path.join(cache_dir, file_name))
+
+def fragment_dir(cache_dir, path):
+    """[cache directory of the fragments of dxf file path ({cache_dir}/{file name}_{hash of absolute path})]
+    """
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{digest}")
+
+def fill_lines(lines): # fill polylines in svg lines for visibility improvement
+    for count in range(len(lines)):
+        matches = re.search(r"; stroke:(.*?);", lines[count])
+        if matches is not None:
+            color = matches.groups()[0]
+            lines[count] = re.sub(r'fill:(.*?);', fr'fill:{color};', lines[count]) # add fill color
+            lines[count] = re.sub(r'fill:', fr'fill-opacity=50%;fill:', lines[count]) # add fill opacity
+    return lines
 
 def svg_fill(path): # fill polylines in svg for visibility improvement
     lines = []
     with open(path, "r") as f:
-        lines = f.readlines()
-        for count in range(len(lines)):
-            matches = re.search(r"; stroke:(.*?);", lines[count])
-            if matches is not None:
-                color = matches.groups()[0]
-                lines[count] = re.sub(r'fill:(.*?);', fr'fill:{color};', lines[count]) # add fill color
-                lines[count] = re.sub(r'fill:', fr'fill-opacity=50%;fill:', lines[count]) # add fill opacity
+        lines = fill_lines(f.readlines())
 
     with open(path, "w") as f:
         f.writelines(lines)
@@ -52,4 +299,4 @@ def svg_fill(path): # fill polylines in svg for visibility improvement
 if __name__ == "__main__":
     path = f"{os.environ['userprofile']}\\Dropbox\\lab\\c0_software\\G2i\\Gerber\\sy_coil_and_hamr_20220902\\sy_coil_and_hamr_20220902.dxf"
     save_path = f"{os.environ['userprofile']}\\Dropbox\\lab\\c0_software\\G2i\\Gerber\\sy_coil_and_hamr_20220902\\sy_coil_and_hamr_20220902.svg"
-    parse_autocad(path, save_path)
\ No newline at end of file
+    parse_autocad(path, save_path)
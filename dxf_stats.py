@@ -0,0 +1,237 @@
+import argparse
+import json
+import math
+import sys
+
+# streaming layout statistics of ascii dxf files (group codes are read one pair at a time, no entities are built)
+
+def new_stats():
+    return {"entities": 0, "types": {}, "vertices": 0, "arcs": 0, "inserts": 0, "bbox": None, "area": 0.0}
+
+def include(stats, xmin, ymin, xmax, ymax): # grow bounding box
+    box = stats["bbox"]
+    if box is None:
+        stats["bbox"] = [xmin, ymin, xmax, ymax]
+    else:
+        box[0], box[1], box[2], box[3] = min(box[0], xmin), min(box[1], ymin), max(box[2], xmax), max(box[3], ymax)
+
+def include_arc(stats, cx, cy, r, start, sweep): # bounding box of arc from angle start by sweep (signed)
+    end = start + sweep
+    xs, ys = [cx + r*math.cos(start), cx + r*math.cos(end)], [cy + r*math.sin(start), cy + r*math.sin(end)]
+    for k, (dx, dy) in enumerate([(1, 0), (0, 1), (-1, 0), (0, -1)]): # extreme points at 0, pi/2, pi, 3pi/2
+        delta = (k*math.pi/2 - start) % (2*math.pi) if sweep > 0 else (start - k*math.pi/2) % (2*math.pi)
+        if delta <= abs(sweep):
+            xs.append(cx + dx*r)
+            ys.append(cy + dy*r)
+    include(stats, min(xs), min(ys), max(xs), max(ys))
+
+class Polyline:
+    """[running shoelace area, arcs and bounding box of a polyline whose vertices arrive one at a time]
+    """
+    def __init__(self):
+        self.first = None # [x, y, bulge]
+        self.previous = None
+        self.pending = None # vertex whose coordinates or bulge may still arrive
+        self.closed = False
+        self.area = 0.0 # twice the signed area
+        self.arcs = 0
+        self.vertices = 0
+
+    def commit(self, stats):
+        if self.pending is None:
+            return None
+        vertex, self.pending = self.pending, None
+        self.vertices += 1
+        include(stats, vertex[0], vertex[1], vertex[0], vertex[1])
+        if self.previous is None:
+            self.first = vertex
+        else:
+            self.segment(stats, self.previous, vertex)
+        self.previous = vertex
+
+    def segment(self, stats, p1, p2):
+        (x1, y1, bulge), (x2, y2, _) = p1, p2
+        self.area += x1*y2 - x2*y1
+        if bulge == 0:
+            return None
+        self.arcs += 1
+        chord = math.hypot(x2 - x1, y2 - y1)
+        if chord == 0:
+            return None
+        theta = 4*math.atan(bulge) # signed included angle
+        r = chord*(1 + bulge**2)/(4*abs(bulge))
+        self.area += r**2*(theta - math.sin(theta)) # circular segment (twice the signed area)
+        k = (1 - bulge**2)/(4*bulge)
+        cx, cy = (x1 + x2)/2 - (y2 - y1)*k, (y1 + y2)/2 + (x2 - x1)*k
+        include_arc(stats, cx, cy, r, math.atan2(y1 - cy, x1 - cx), theta)
+
+    def finish(self, stats):
+        self.commit(stats)
+        if self.previous is not None and self.closed and self.previous is not self.first:
+            self.segment(stats, self.previous, self.first) # closing segment
+        stats["vertices"] += self.vertices
+        stats["arcs"] += self.arcs
+        if self.closed:
+            stats["area"] += abs(self.area)/2
+
+def analyze(path):
+    """[per layer entity counts, vertex counts, arc counts, bounding boxes and areas of the ENTITIES section]
+
+    areas of overlapping polygons are added up. block contents are not expanded (inserts are counted).
+    """
+    layers = {}
+    with open(path, "rb") as f:
+        if f.read(18) == b"AutoCAD Binary DXF":
+            raise ValueError(f"{path} is a binary dxf file (only ascii dxf files can be streamed)")
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        section, kind, layer, values, polyline = None, None, "0", {}, None
+        entity_stats = None
+
+        def finish(): # add the entity that just ended to its layer
+            nonlocal polyline
+            stats = layers.setdefault(layer, new_stats())
+            stats["entities"] += 1
+            stats["types"][kind] = stats["types"].get(kind, 0) + 1
+            x, y = values.get("10"), values.get("20")
+            if kind == "LWPOLYLINE":
+                polyline.finish(stats)
+            elif kind == "POLYLINE":
+                return None # vertices follow as VERTEX entities until SEQEND
+            elif kind == "LINE" and None not in (x, y, values.get("11"), values.get("21")):
+                stats["vertices"] += 2
+                include(stats, min(x, values["11"]), min(y, values["21"]), max(x, values["11"]), max(y, values["21"]))
+            elif kind in ("CIRCLE", "ARC") and None not in (x, y, values.get("40")):
+                r = values["40"]
+                stats["arcs"] += 1
+                if kind == "CIRCLE":
+                    include(stats, x - r, y - r, x + r, y + r)
+                    stats["area"] += math.pi*r**2
+                else:
+                    start, end = math.radians(values.get("50", 0.0)), math.radians(values.get("51", 360.0))
+                    include_arc(stats, x, y, r, start, (end - start) % (2*math.pi) or 2*math.pi)
+            elif kind in ("INSERT", "POINT") and None not in (x, y):
+                stats["inserts"] += kind == "INSERT"
+                include(stats, x, y, x, y)
+            polyline = None
+
+        for code, value in zip(f, f): # (group code, value) pairs
+            code, value = code.strip(), value.strip()
+            if code == "0":
+                if section == "ENTITIES" and kind is not None:
+                    if kind == "VERTEX" and polyline is not None: # vertex of old style POLYLINE
+                        polyline.pending = [values.get("10", 0.0), values.get("20", 0.0), values.get("42", 0.0)]
+                        polyline.commit(entity_stats)
+                    elif kind == "SEQEND" and polyline is not None:
+                        polyline.finish(entity_stats)
+                        polyline = None
+                    elif kind not in ("VERTEX", "SEQEND"):
+                        finish()
+                        if kind == "POLYLINE":
+                            entity_stats = layers[layer]
+                            polyline = Polyline()
+                            polyline.closed = bool(values.get("70", 0) & 1)
+                kind, values = value, {}
+                if value == "SECTION" or value == "ENDSEC":
+                    section = None
+                    continue
+                if kind not in ("VERTEX", "SEQEND"):
+                    layer = "0"
+                if kind == "LWPOLYLINE":
+                    polyline = Polyline()
+                continue
+            if section is None and kind == "SECTION" and code == "2":
+                section, kind = value, None
+            elif section != "ENTITIES" or kind is None:
+                continue
+            elif code == "8" and kind not in ("VERTEX", "SEQEND"):
+                layer = value
+            elif kind == "LWPOLYLINE" and code in ("10", "20", "42", "70"):
+                number = float(value)
+                if code == "10":
+                    polyline.commit(layers.setdefault(layer, new_stats()))
+                    polyline.pending = [number, 0.0, 0.0]
+                elif code == "20":
+                    polyline.pending[1] = number
+                elif code == "42":
+                    polyline.pending[2] = number
+                else:
+                    polyline.closed = bool(int(number) & 1)
+            elif code in ("10", "20", "11", "21", "40", "42", "50", "51"):
+                values.setdefault(code, float(value)) # first value (e.g. not the extrusion of HATCH boundaries)
+            elif code == "70":
+                values.setdefault(code, int(value))
+
+    total = new_stats()
+    for stats in layers.values():
+        for key in ("entities", "vertices", "arcs", "inserts", "area"):
+            total[key] += stats[key]
+        for kind, count in stats["types"].items():
+            total["types"][kind] = total["types"].get(kind, 0) + count
+        if stats["bbox"] is not None:
+            include(total, *stats["bbox"])
+    return {"file": path, "layers": layers, "total": total}
+
+def diff_stats(a, b):
+    """[changed fields of two stats ({field: [old, new, relative change]})]
+    """
+    fields = {}
+    for key in ("entities", "vertices", "arcs", "inserts", "area"):
+        if a[key] != b[key]:
+            fields[key] = [a[key], b[key], (b[key] - a[key])/a[key] if a[key] else None]
+    if a["bbox"] != b["bbox"]:
+        fields["bbox"] = [a["bbox"], b["bbox"], None]
+    return fields
+
+def diff_reports(old, new):
+    """[changes of numbers between two reports ({"layers": {layer: {field: [old, new, relative change]}}, "total": {field: ...}})]
+    """
+    layers = {}
+    for layer in dict.fromkeys(list(old["layers"]) + list(new["layers"])):
+        fields = diff_stats(old["layers"].get(layer, new_stats()), new["layers"].get(layer, new_stats()))
+        if fields:
+            layers[layer] = fields
+    return {"layers": layers, "total": diff_stats(old["total"], new["total"])}
+
+def growth_exceeded(changes, max_growth):
+    """[fields whose relative growth is larger than max_growth (new layers always count)]
+    """
+    exceeded = []
+    for label, fields in [(f"layer {layer}", fields) for layer, fields in changes["layers"].items()] + [("total", changes["total"])]:
+        for key, (a, b, relative) in fields.items():
+            if key != "bbox" and b > a and (relative is None or relative > max_growth):
+                exceeded.append(f"{label} {key}: {a} -> {b}")
+    return exceeded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per layer statistics of dxf files (streamed, constant memory)")
+    parser.add_argument("paths", nargs="+", help="dxf file to analyze, or two json reports with --diff")
+    parser.add_argument("-o", "--output", help="write json report to this file instead of stdout")
+    parser.add_argument("--diff", action="store_true", help="compare two json reports (old, new)")
+    parser.add_argument("--max-growth", type=float, help="with --diff, exit with 1 if a count or area grows by more than this ratio")
+    args = parser.parse_args()
+    if args.diff and len(args.paths) != 2:
+        parser.error("--diff needs two json reports (old, new)")
+    if not args.diff and len(args.paths) != 1:
+        parser.error("give one dxf file (or two json reports with --diff)")
+    if args.max_growth is not None and not args.diff:
+        parser.error("--max-growth needs --diff")
+
+    if args.diff:
+        reports = []
+        for path in args.paths:
+            with open(path) as f:
+                reports.append(json.load(f))
+        result = diff_reports(*reports)
+    else:
+        result = analyze(args.paths[0])
+    text = json.dumps(result, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if args.diff and args.max_growth is not None:
+        exceeded = growth_exceeded(result, args.max_growth)
+        for line in exceeded:
+            print(f"grew by more than {args.max_growth:.0%}: {line}", file=sys.stderr)
+        sys.exit(1 if exceeded else 0)